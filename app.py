@@ -11,26 +11,40 @@ Updated: 10/30/2025
 
 import os
 import json
+import gzip
+import hashlib
+import brotli
+import orjson
 import logging
 import sqlite3
-from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, send_from_directory
-from yfpy.query import YahooFantasySportsQuery
-import yahoo_fantasy_api as yfa
-from yahoo_oauth import OAuth2
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, send_from_directory, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from flask.sessions import SessionInterface
+from itsdangerous import BadSignature, URLSafeSerializer
+from whitenoise import WhiteNoise
+from flask_compress import Compress
 from requests_oauthlib import OAuth2Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from oauthlib.common import generate_token
+from urllib.parse import urlencode, quote
 import time
 import re
 import db_builder
 import uuid
 from datetime import date, timedelta, datetime
-import shutil
 from collections import defaultdict, Counter
 import itertools
 import copy
-from queue import Queue
+import functools
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
 from pathlib import Path
+try:
+    import fcntl
+except ImportError: # Windows dev machines
+    fcntl = None
 
 # --- Flask App Configuration ---
 # Assume a 'data' directory exists for storing database files
@@ -41,21 +55,398 @@ if not os.path.exists(DATA_DIR):
 SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server')
 TEST_DB_FILENAME = 'yahoo-22705-Albany Hockey Hooligans Test.db'
 TEST_DB_PATH = os.path.join(SERVER_DIR, TEST_DB_FILENAME)
+# --- NEW: The test DB ships with the app and never changes while it runs, so
+# look it up once instead of stat()ing it on every test-mode request. ---
+try:
+    TEST_DB_MTIME = os.stat(TEST_DB_PATH).st_mtime
+except FileNotFoundError:
+    TEST_DB_MTIME = None
+TEST_DB_EXISTS = TEST_DB_MTIME is not None
+# Page-data routes only read the league DB, so let SQLite map it into memory
+# instead of copying every page through read() calls.
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024 # bytes
+# Build logs are written line by line and tailed by /api/db_log_stream every
+# half second, then deleted. Keep them on RAM-backed tmpfs when there is one.
+BUILD_LOG_DIR = '/dev/shm' if os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+
+# --- NEW: orjson-backed JSON responses ---
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes with orjson. Keys are sorted and dates go
+    through Flask's default() just like the stdlib provider; calls that pass
+    json.dumps keyword arguments, and debug-mode pretty printing, fall back to it.
+    """
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self._app.debug and self.compact is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "a-strong-dev-secret-key-for-local-testing")
+
+# --- NEW: DB downloads without copying through Python ---
+# send_from_directory hands the open file to the server's wsgi.file_wrapper,
+# which gunicorn writes out with sendfile(2). Behind a proxy that serves files
+# itself (nginx internal location, Apache mod_xsendfile), set USE_X_SENDFILE=1
+# so the app only emits an X-Sendfile header. Render's proxy doesn't, so it's
+# off by default.
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
+# nginx ignores X-Sendfile and wants X-Accel-Redirect to an internal location
+# instead. Set X_ACCEL_REDIRECT_PREFIX to that location's URI prefix (e.g.
+# "/internal-db/" for `location /internal-db/ { internal; alias <DATA_DIR>/; }`)
+# and league DB downloads are handed to nginx by name.
+X_ACCEL_REDIRECT_PREFIX = os.environ.get("X_ACCEL_REDIRECT_PREFIX")
+
+# --- NEW: Static files via WhiteNoise ---
+# WhiteNoise answers /static/ requests in front of Flask from an index of the
+# directory built once at startup, with ETag/Last-Modified revalidation, so
+# page loads no longer go through send_from_directory's per-hit stat and open.
+# The file index is only rebuilt on each request when running the dev server.
+app.wsgi_app = WhiteNoise(
+    app.wsgi_app,
+    root=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+    prefix='static/',
+    autorefresh=__name__ == '__main__',
+)
+
+# --- NEW: Response compression ---
+# Page-data JSON is large and repetitive (the free agent payload alone is
+# ~480 KB), so compress it for clients that accept br or gzip. Static files are
+# answered by WhiteNoise above, and streamed responses (the build log SSE, DB
+# downloads) are left alone.
+app.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_MIMETYPES=['application/json', 'text/html'],
+    COMPRESS_MIN_SIZE=512,
+    COMPRESS_STREAMS=False,
+)
+Compress(app)
+
+# --- NEW: Server-side sessions ---
+# The Yahoo token dict otherwise rides in the signed cookie on every request and
+# response. With a Redis instance configured, keep it server-side and send the
+# browser only a signed session id. Without one (local dev), the default cookie
+# session is used unchanged.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    import redis
+    from flask_session import Session
+
+    app.config.update(
+        SESSION_TYPE='redis',
+        SESSION_REDIS=redis.Redis(connection_pool=redis.ConnectionPool.from_url(REDIS_URL, max_connections=32)),
+        SESSION_USE_SIGNER=True,
+        SESSION_PERMANENT=False,
+    )
+    Session(app)
+
+# --- NEW: Session-free landing, health and static requests ---
+# The landing page only needs to know whether to bounce the visitor to /home,
+# so it reads a small flag cookie set at login instead of the session. For
+# these paths the session (signed cookie or Redis entry) is never loaded.
+# The flag is signed with the app secret (as Flask signs its session cookie), so
+# a hand-set cookie can't make / skip the landing page; /home still checks the
+# session itself.
+LOGGED_IN_COOKIE = 'fs_logged_in'
+LOGGED_IN_COOKIE_SIGNER = URLSafeSerializer(app.secret_key, salt='fs-logged-in')
+SESSIONLESS_PATHS = frozenset({'/', '/healthz'})
+
+
+def _set_logged_in_cookie(response):
+    response.set_cookie(LOGGED_IN_COOKIE, LOGGED_IN_COOKIE_SIGNER.dumps(1), httponly=True, samesite='Lax')
+    return response
+
+
+def _has_logged_in_cookie():
+    value = request.cookies.get(LOGGED_IN_COOKIE)
+    if not value:
+        return False
+    try:
+        return LOGGED_IN_COOKIE_SIGNER.loads(value) == 1
+    except BadSignature:
+        return False
+
+
+class SessionlessPathsInterface(SessionInterface):
+    """Wraps the app's session interface, skipping it for SESSIONLESS_PATHS and /static/."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def open_session(self, app, request):
+        if request.path in SESSIONLESS_PATHS or request.path.startswith('/static/'):
+            return self.make_null_session(app)
+        return self.inner.open_session(app, request)
+
+    def save_session(self, app, session, response):
+        return self.inner.save_session(app, session, response)
+
+
+app.session_interface = SessionlessPathsInterface(app.session_interface)
+
 # Configure root logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-DB_BUILD_QUEUES = {}
-DB_QUEUES_LOCK = threading.Lock() # To safely add/remove from the dict
-
-db_build_status = {"running": False, "error": None, "current_build_id": None}
+# --- MODIFIED: Build status is tracked per league ---
+# Builds for different leagues touch different DB files, so one league's build
+# no longer turns every other league's users away (or hands them its log stream).
+db_build_status = {} # league_id -> {"running": bool, "error": str | None, "current_build_id": str | None}
 db_build_status_lock = threading.Lock()
+# Set by a build thread when it finishes, so log streams in this process wake
+# up immediately instead of stat-polling for the .done file. The file stays as
+# the signal for streams served by another worker. Guarded by
+# db_build_status_lock too: db_action prunes it while other threads look up
+# and set events, so every touch goes through the same lock.
+BUILD_DONE_EVENTS = {} # build_id -> threading.Event
+
+# --- NEW: Cross-worker build lock ---
+# db_build_status only guards builds started by this process. With more than
+# one worker, a second worker would happily start a parallel build over the same
+# files, so a build also holds an flock on a per-league file in DATA_DIR
+# (holding the build id for other workers to report). The OS drops the lock if
+# the worker dies, so a crash can't leave a stale "build in progress".
+BUILD_LOCK_PATH_FORMAT = os.path.join(DATA_DIR, '.build-{league_id}.lock')
+
+
+def _claim_build_lock(league_id, build_id):
+    """
+    Takes the cross-worker build lock for a league. Returns (True, lock_file)
+    when claimed (lock_file is None where flock isn't available) or
+    (False, active_build_id) when another worker is building that league.
+    """
+    if fcntl is None:
+        return True, None
+    lock_file = open(BUILD_LOCK_PATH_FORMAT.format(league_id=quote(str(league_id), safe='')), 'a+', encoding='utf-8')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.seek(0)
+        active_build_id = lock_file.read().strip() or None
+        lock_file.close()
+        return False, active_build_id
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(build_id)
+    lock_file.flush()
+    return True, lock_file
+
+
+def _release_build_lock(lock_file):
+    """Clears and releases a lock taken by _claim_build_lock."""
+    if lock_file is None:
+        return
+    lock_file.seek(0)
+    lock_file.truncate()
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+# --- Yahoo query result cache ---
+# yfpy queries are read-only and league data changes slowly, so repeat console
+# queries are answered from memory for a few minutes instead of
+# re-authenticating and re-fetching from Yahoo on every request.
+YAHOO_QUERY_CACHE_TTL = 300 # seconds
+# Past this many live entries the least-used one is evicted (LFU), so one-off
+# queries can't crowd out the ones being repeated.
+YAHOO_QUERY_CACHE_MAX_ENTRIES = 256
+YAHOO_QUERY_CACHE = {} # (user, league_id, query) -> [expires_at, result, hits]
+YAHOO_QUERY_CACHE_LOCK = threading.Lock()
+
+# --- Pre-encoded logged-out responses ---
+# These bodies never change, so encode them once. A fresh Response is still
+# built per request because Flask attaches per-request headers (cookies) to it.
+DB_STATUS_LOGGED_OUT_BODY = json.dumps({'db_exists': False, 'error': 'Not logged in.', 'is_test_db': False})
+NOT_AUTHENTICATED_BODY = json.dumps({'error': 'Not authenticated'})
+DOWNLOAD_LOGGED_OUT_BODY = json.dumps({'error': 'Not logged in or session expired.'})
+
+
+def json_body_response(body, status=200):
+    """Returns a JSON Response for an already-encoded body."""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+# --- Validated yfa OAuth clients ---
+# Building a yahoo_oauth OAuth2 client sets up a new rauth service and HTTP
+# session and re-checks the token. Keep the client per access token (keyed by
+# its hash) so yfa queries reuse it, and its connections, until it goes stale.
+YFA_OAUTH_CACHE = {} # sha256(access_token) -> OAuth2
+YFA_OAUTH_CACHE_LOCK = threading.Lock()
+
+# --- League key cache ---
+# yfpy resolves "<game_key>.l.<league_id>" with a game metadata request every
+# time a query needs it (it never stores the result). The key only changes when
+# a new season starts, so remember it per league and pin it on each new
+# instance. A miss is left to the first query that actually needs the key.
+LEAGUE_KEY_CACHE_TTL = 12 * 3600 # seconds
+LEAGUE_KEY_CACHE = {} # league_id -> (expires_at, league_key)
+LEAGUE_KEY_CACHE_LOCK = threading.Lock()
+
+# --- Per-user Yahoo rate limit ---
+# Yahoo throttles (HTTP 999) per app, so one user hammering the query consoles
+# would stall every user. Each user gets a token bucket that allows short
+# bursts and refills at a steady rate.
+YAHOO_RATE_LIMIT_PER_MINUTE = 30
+YAHOO_RATE_LIMIT_BURST = 10
+YAHOO_RATE_BUCKETS = {} # user -> (tokens, last_refill)
+YAHOO_RATE_BUCKETS_LOCK = threading.Lock()
 
 # --- Yahoo OAuth2 Settings ---
 authorization_base_url = 'https://api.login.yahoo.com/oauth2/request_auth'
 token_url = 'https://api.login.yahoo.com/oauth2/get_token'
+YAHOO_CONSUMER_KEY = os.environ.get("YAHOO_CONSUMER_KEY")
+YAHOO_CONSUMER_SECRET = os.environ.get("YAHOO_CONSUMER_SECRET")
+# Everything in the authorization URL except redirect_uri and state is fixed
+# for the life of the process, so encode it once.
+YAHOO_AUTH_URL_PREFIX = authorization_base_url + '?' + urlencode({
+    'response_type': 'code',
+    'client_id': YAHOO_CONSUMER_KEY or '',
+})
+# Shared by the per-login OAuth2Sessions so token exchanges reuse pooled
+# keep-alive connections (and their TLS handshakes) to api.login.yahoo.com.
+# Connection failures and throttled/unavailable responses are retried with a
+# short backoff; Yahoo did not process the code in those cases, so the
+# single-use authorization code is still good.
+YAHOO_LOGIN_ADAPTER = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset({'POST'}),
+    ),
+)
+YAHOO_TOKEN_TIMEOUT = (3, 10) # (connect, read) seconds
+
+# --- NEW: Shared Yahoo Fantasy API connection pool ---
+# yfpy and yfa each build a fresh rauth session per client, so every console
+# query or build used to open (and TLS-handshake) new connections to the
+# Fantasy API. Mounting one adapter on all of them keeps a warm keep-alive pool
+# for the process. Gateway errors on these idempotent GETs get a quick retry;
+# the last response is still handed back to the caller as before.
+YAHOO_API_ADAPTER = HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+    ),
+)
+
+
+def _mount_yahoo_adapters(http_session):
+    http_session.mount('https://', YAHOO_API_ADAPTER)
+    http_session.mount('https://api.login.yahoo.com/', YAHOO_LOGIN_ADAPTER)
+    return http_session
+
+
+def _use_shared_yahoo_pool(oauth):
+    """
+    Routes a yahoo_oauth client's HTTP sessions through the shared adapters.
+    rauth builds a new session for each token refresh, and yfa rebuilds the
+    client's session after one, so the service's session factory is wrapped too:
+    library-driven refreshes reuse YAHOO_LOGIN_ADAPTER's pool and the rebuilt
+    session stays on YAHOO_API_ADAPTER.
+    """
+    service = oauth.oauth
+    if not getattr(service, 'uses_shared_yahoo_pool', False):
+        make_session = service.get_session
+        service.get_session = lambda token=None: _mount_yahoo_adapters(make_session(token))
+        service.uses_shared_yahoo_pool = True
+    _mount_yahoo_adapters(oauth.session)
+
+# --- NEW: Background token refresh ---
+# Yahoo access tokens last an hour. Rather than have a user's API call stall on
+# a refresh once the token has lapsed, a request that finds the token inside
+# this margin kicks off the refresh in the background and carries on with the
+# still-valid token; a later request from the same session picks up the result.
+TOKEN_REFRESH_MARGIN = 600 # seconds
+TOKEN_REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='token-refresh')
+PENDING_TOKEN_REFRESHES = {} # refresh_token -> (submitted_at, future)
+PENDING_TOKEN_REFRESHES_LOCK = threading.Lock()
+
+
+# Yahoo's token response also carries an id_token JWT (about as long as the
+# access token) and scope, which nothing reads. Keep only what the app uses so
+# the session written on every refresh stays small.
+SESSION_TOKEN_FIELDS = ('access_token', 'refresh_token', 'token_type', 'expires_in', 'expires_at', 'xoauth_yahoo_guid')
+
+
+def _session_token(token):
+    return {key: token[key] for key in SESSION_TOKEN_FIELDS if key in token}
+
+
+def _refresh_yahoo_token(token):
+    """Exchanges the token's refresh_token for a new token dict (runs off the request path)."""
+    yahoo = OAuth2Session(YAHOO_CONSUMER_KEY, token=token)
+    yahoo.mount('https://', YAHOO_LOGIN_ADAPTER)
+    new_token = yahoo.refresh_token(
+        token_url,
+        refresh_token=token['refresh_token'],
+        auth=(YAHOO_CONSUMER_KEY, YAHOO_CONSUMER_SECRET),
+        timeout=YAHOO_TOKEN_TIMEOUT
+    )
+    return _session_token({**token, **new_token})
+
+
+@app.before_request
+def refresh_token_ahead_of_expiry():
+    token = session.get('yahoo_token')
+    if not token or session.get('dev_mode') or not token.get('refresh_token'):
+        return
+
+    refresh_key = token['refresh_token']
+    now = time.time()
+    with PENDING_TOKEN_REFRESHES_LOCK:
+        pending = PENDING_TOKEN_REFRESHES.get(refresh_key)
+        if pending and pending[1].done():
+            del PENDING_TOKEN_REFRESHES[refresh_key]
+        elif pending is None and token.get('expires_at', 0) - now < TOKEN_REFRESH_MARGIN:
+            # Drop results nobody came back for.
+            for key, (submitted_at, future) in list(PENDING_TOKEN_REFRESHES.items()):
+                if future.done() and now - submitted_at > 3600:
+                    del PENDING_TOKEN_REFRESHES[key]
+            PENDING_TOKEN_REFRESHES[refresh_key] = (now, TOKEN_REFRESH_EXECUTOR.submit(_refresh_yahoo_token, dict(token)))
+            return
+        else:
+            return
+
+    try:
+        session['yahoo_token'] = pending[1].result()
+        logging.info("Session token updated from background refresh.")
+    except Exception as e:
+        # Leave the session as is; the request path still refreshes inline.
+        logging.error(f"Background token refresh failed: {e}")
+
+@app.after_request
+def mark_session_dependent_responses(response):
+    # Anything rendered from a session is per-user: shared caches must key it
+    # by cookie and never hand it to someone else. Responses that set their own
+    # freshness (ETag revalidation, short private max-age) keep it.
+    if session.accessed and not app.session_interface.is_null_session(session):
+        response.vary.add('Cookie')
+        cache_control = response.cache_control
+        cache_control.public = False
+        cache_control.private = True
+        if cache_control.max_age is None and not cache_control.no_cache:
+            cache_control.no_store = True
+    return response
 
 def model_to_dict(obj):
     """
@@ -78,6 +469,66 @@ def model_to_dict(obj):
             result[key] = model_to_dict(value)
     return result
 
+def _pin_league_key(yq, league_id):
+    """
+    Sets yq.league_key from the cache. On a miss nothing is fetched here:
+    yq.get_league_key is wrapped so the first successful resolution is pinned on
+    yq and cached, and a failure surfaces in the query that needed it.
+    """
+    with LEAGUE_KEY_CACHE_LOCK:
+        entry = LEAGUE_KEY_CACHE.get(league_id)
+    if entry and entry[0] > time.time():
+        yq.league_key = entry[1]
+        return
+
+    resolve_league_key = yq.get_league_key
+
+    def get_league_key(season=None):
+        league_key = resolve_league_key(season)
+        if season is None and yq.league_key != league_key:
+            yq.league_key = league_key
+            with LEAGUE_KEY_CACHE_LOCK:
+                LEAGUE_KEY_CACHE[league_id] = (time.time() + LEAGUE_KEY_CACHE_TTL, league_key)
+        return league_key
+
+    yq.get_league_key = get_league_key
+
+
+def _fresh_session_token():
+    """
+    Returns the session's Yahoo token, refreshing it first if it has expired.
+    The refresh is one POST through YAHOO_LOGIN_ADAPTER's warm pool; left to
+    yfpy/yahoo_oauth, each client constructor would build its own rauth
+    service and connection just to refresh.
+    """
+    token = session['yahoo_token']
+    if session.get('dev_mode') or not token.get('refresh_token') or 'expires_at' not in token:
+        return token
+    if token['expires_at'] - time.time() > 60:
+        return token
+    # --- MODIFIED: Join a background refresh already in flight for this token
+    # instead of racing it with a second round-trip to Yahoo. ---
+    with PENDING_TOKEN_REFRESHES_LOCK:
+        pending = PENDING_TOKEN_REFRESHES.pop(token['refresh_token'], None)
+    new_token = None
+    if pending is not None:
+        try:
+            new_token = pending[1].result(timeout=sum(YAHOO_TOKEN_TIMEOUT))
+        except Exception as e:
+            logging.error(f"Background token refresh failed: {e}")
+    if new_token is None:
+        try:
+            new_token = _refresh_yahoo_token(token)
+        except Exception as e:
+            # Let the client library try its own refresh.
+            logging.error(f"Inline token refresh failed: {e}")
+            return token
+    token = new_token
+    session['yahoo_token'] = token
+    logging.info("Session token refreshed before building Yahoo client.")
+    return token
+
+
 def get_yfpy_instance():
     """Helper function to get an authenticated yfpy instance."""
     # --- THIS FUNCTION IS NOT THREAD-SAFE (relies on session) ---
@@ -88,10 +539,10 @@ def get_yfpy_instance():
         logging.info("Dev mode: Skipping real yfpy init.")
         pass
 
-    token = session['yahoo_token']
+    token = _fresh_session_token()
     auth_data = {
-        'consumer_key': session.get('consumer_key', 'dev_key'), # Add defaults for dev_mode
-        'consumer_secret': session.get('consumer_secret', 'dev_secret'), # Add defaults for dev_mode
+        'consumer_key': YAHOO_CONSUMER_KEY or 'dev_key', # Add defaults for dev_mode
+        'consumer_secret': YAHOO_CONSUMER_SECRET or 'dev_secret', # Add defaults for dev_mode
         'access_token': token.get('access_token'),
         'refresh_token': token.get('refresh_token'),
         'token_type': token.get('token_type', 'bearer'),
@@ -99,16 +550,139 @@ def get_yfpy_instance():
         'guid': token.get('xoauth_yahoo_guid')
     }
     try:
+        from yfpy.query import YahooFantasySportsQuery
         yq = YahooFantasySportsQuery(
             session['league_id'],
             game_code="nhl",
-            yahoo_access_token_json=auth_data
+            yahoo_access_token_json=auth_data,
+            # Everything is passed explicitly; don't consult YAHOO_* env vars per client.
+            env_var_fallback=False
         )
+        _use_shared_yahoo_pool(yq.oauth)
+        _pin_league_key(yq, session['league_id'])
         return yq
     except Exception as e:
         logging.error(f"Failed to init yfpy (expected in dev mode): {e}", exc_info=True)
         return None
 
+# --- NEW: Yahoo client libraries are imported on first use ---
+# yfpy, yahoo_oauth and yahoo_fantasy_api (with their rauth/objectpath
+# dependencies) add tens of ms to every worker start but are only needed by the
+# query consoles and DB builds; page and DB-backed API requests never load them.
+
+# --- NEW: League settings cache on disk ---
+# yfa's League asks its handler for the raw league settings from settings(),
+# stat_categories(), positions(), edit_date() and its stat id map (and, in
+# recent releases, from its constructor), and a fresh League is built for every
+# console query and build. The settings only change at the weekly rollover
+# (current_week), so keep the raw response per league for the day in a small
+# SQLite file that survives restarts and sleeps, and only ask Yahoo once a day
+# per league.
+LEAGUE_SETTINGS_CACHE_PATH = os.path.join(DATA_DIR, '_cache.db')
+LEAGUE_SETTINGS_CACHE_TTL = 24 * 3600 # seconds
+# Console queries rebuild the League on every call; serve repeats from memory
+# before touching the SQLite file. Entries are per Yahoo user (guid) so one
+# user's token never answers for a league another user fetched.
+LEAGUE_SETTINGS_MEMO = {} # "guid:league_key" -> (fetched_on, fetched_at, settings)
+LEAGUE_SETTINGS_MEMO_LOCK = threading.Lock()
+
+
+def _open_league_settings_cache():
+    conn = sqlite3.connect(LEAGUE_SETTINGS_CACHE_PATH, timeout=5)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS league_settings (
+            league_key TEXT PRIMARY KEY,
+            fetched_on TEXT NOT NULL,
+            fetched_at INTEGER NOT NULL,
+            settings_json TEXT NOT NULL
+        )
+    """)
+    return conn
+
+
+class SettingsCachingYHandler:
+    """
+    yfa handler that serves league settings from LEAGUE_SETTINGS_CACHE_PATH when
+    fresh and hands every other call to a regular YHandler.
+    """
+
+    def __init__(self, sc):
+        from yahoo_fantasy_api.yhandler import YHandler
+        self.handler = YHandler(sc)
+        # yahoo_oauth clients built here carry xoauth_yahoo_guid; yfpy's carry guid.
+        self.guid = getattr(sc, 'xoauth_yahoo_guid', None) or getattr(sc, 'guid', None)
+
+    def __getattr__(self, name):
+        return getattr(self.handler, name)
+
+    def _remember(self, cache_key, fetched_on, fetched_at, settings):
+        oldest = int(time.time()) - LEAGUE_SETTINGS_CACHE_TTL
+        with LEAGUE_SETTINGS_MEMO_LOCK:
+            for key in [k for k, v in LEAGUE_SETTINGS_MEMO.items() if v[0] != fetched_on or v[1] <= oldest]:
+                del LEAGUE_SETTINGS_MEMO[key]
+            LEAGUE_SETTINGS_MEMO[cache_key] = (fetched_on, fetched_at, settings)
+
+    def get_settings_raw(self, league_id):
+        if not self.guid:
+            # Without a user to key on, a cached entry could answer for another
+            # user's league; go to Yahoo every time.
+            return self.handler.get_settings_raw(league_id)
+        today = date.today().isoformat()
+        cache_key = f"{self.guid}:{league_id}"
+        oldest = int(time.time()) - LEAGUE_SETTINGS_CACHE_TTL
+        with LEAGUE_SETTINGS_MEMO_LOCK:
+            cached = LEAGUE_SETTINGS_MEMO.get(cache_key)
+        if cached and cached[0] == today and cached[1] > oldest:
+            return cached[2]
+
+        try:
+            conn = _open_league_settings_cache()
+            try:
+                row = conn.execute(
+                    "SELECT fetched_at, settings_json FROM league_settings WHERE league_key = ? AND fetched_on = ? AND fetched_at > ?",
+                    (cache_key, today, oldest)
+                ).fetchone()
+            finally:
+                conn.close()
+            if row:
+                settings = json.loads(row[1])
+                self._remember(cache_key, today, row[0], settings)
+                return settings
+        except sqlite3.Error as e:
+            logging.warning(f"League settings cache unavailable: {e}")
+
+        settings = self.handler.get_settings_raw(league_id)
+        fetched_at = int(time.time())
+        self._remember(cache_key, today, fetched_at, settings)
+        try:
+            conn = _open_league_settings_cache()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO league_settings (league_key, fetched_on, fetched_at, settings_json) VALUES (?, ?, ?, ?)",
+                        (cache_key, today, fetched_at, json.dumps(settings))
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not cache league settings: {e}")
+        return settings
+
+
+def _yfa_league(sc, league_id):
+    """Builds the yfa League for an NHL league id, using the settings cache."""
+    from yahoo_fantasy_api import League
+    return League(sc, f"nhl.l.{league_id}", handler=SettingsCachingYHandler(sc))
+
+
+def _cache_yfa_oauth_client(token_hash, sc):
+    """Remembers a validated yahoo_oauth client, dropping any that have gone stale."""
+    with YFA_OAUTH_CACHE_LOCK:
+        for stale_hash in [h for h, client in YFA_OAUTH_CACHE.items() if not client.token_is_valid()]:
+            del YFA_OAUTH_CACHE[stale_hash]
+        YFA_OAUTH_CACHE[token_hash] = sc
+
+
 def get_yfa_lg_instance():
     """Helper function to get an authenticated yfa league instance."""
     # --- THIS FUNCTION IS NOT THREAD-SAFE (relies on session) ---
@@ -119,9 +693,9 @@ def get_yfa_lg_instance():
         logging.info("Dev mode: Skipping real yfa init.")
         return None
 
-    token = session['yahoo_token']
-    consumer_key = session.get('consumer_key')
-    consumer_secret = session.get('consumer_secret')
+    token = _fresh_session_token()
+    consumer_key = YAHOO_CONSUMER_KEY
+    consumer_secret = YAHOO_CONSUMER_SECRET
     league_id = session.get('league_id')
 
     if not all([token, consumer_key, consumer_secret, league_id]):
@@ -129,8 +703,6 @@ def get_yfa_lg_instance():
         return None
 
     creds = {
-        "consumer_key": consumer_key,
-        "consumer_secret": consumer_secret,
         "access_token": token.get('access_token'),
         "refresh_token": token.get('refresh_token'),
         "token_type": token.get('token_type', 'bearer'),
@@ -138,53 +710,377 @@ def get_yfa_lg_instance():
         "xoauth_yahoo_guid": token.get('xoauth_yahoo_guid')
     }
 
-    temp_dir = os.path.join(tempfile.gettempdir(), 'temp_creds')
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_file_path = os.path.join(temp_dir, f"{uuid.uuid4()}.json")
-
     try:
-        with open(temp_file_path, 'w') as f:
-            json.dump(creds, f)
-
-        sc = OAuth2(None, None, from_file=temp_file_path)
-        if not sc.token_is_valid():
-            logging.info("YFA token expired, refreshing...")
-            sc.refresh_access_token()
-            # Read the *new* credentials back from the file
-            with open(temp_file_path, 'r') as f:
-                new_creds = json.load(f)
-
+        # A client already built (and validated) for this access token is reused
+        # until yahoo_oauth considers the token stale.
+        token_hash = hashlib.sha256(creds['access_token'].encode()).hexdigest()
+        with YFA_OAUTH_CACHE_LOCK:
+            sc = YFA_OAUTH_CACHE.get(token_hash)
+        if sc is not None and sc.token_is_valid():
+            return _yfa_league(sc, league_id)
+
+        # --- MODIFIED: Build the OAuth2 client from the session creds in memory ---
+        # yahoo_oauth takes the credentials as keyword arguments, so there is no
+        # need to round-trip them through a temp JSON file on every request.
+        # The constructor refreshes an expired token itself.
+        from yahoo_oauth import OAuth2
+        sc = OAuth2(consumer_key, consumer_secret, store_file=False, **creds)
+        _use_shared_yahoo_pool(sc)
+        _cache_yfa_oauth_client(token_hash, sc)
+        if sc.access_token != creds['access_token']:
             # --- CRITICAL: Update the session ---
-            session['yahoo_token']['access_token'] = new_creds.get('access_token')
-            session['yahoo_token']['refresh_token'] = new_creds.get('refresh_token')
-            session['yahoo_token']['expires_at'] = new_creds.get('token_time')
+            session['yahoo_token']['access_token'] = sc.access_token
+            session['yahoo_token']['refresh_token'] = sc.refresh_token
+            session['yahoo_token']['expires_at'] = sc.token_time
             session.modified = True
             logging.info("Session token updated after YFA refresh.")
 
-        gm = yfa.Game(sc, 'nhl')
-        lg = gm.to_league(f"nhl.l.{league_id}")
-        return lg
+        return _yfa_league(sc, league_id)
     except Exception as e:
         logging.error(f"Failed to init yfa: {e}", exc_info=True)
         return None
-    finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+
+
+def _find_league_db_entry(league_id):
+    """
+    Returns the os.DirEntry of the league's database in DATA_DIR, or None if it
+    hasn't been built yet. Uses os.scandir so the directory is streamed and
+    the file-type check comes from the cached dirent instead of extra stats;
+    entry.stat() then costs a single stat call, cached on the entry.
+    """
+    prefix = f"yahoo-{league_id}-"
+    with os.scandir(DATA_DIR) as it:
+        for entry in it:
+            name = entry.name
+            if name.startswith(prefix) and name.endswith(".db") and entry.is_file(follow_symlinks=False):
+                return entry
+    return None
+
+
+# --- NEW: League DB filename cache ---
+# Every DB-backed request resolves the league's file, which used to scan all of
+# DATA_DIR (DBs for every league, build logs, .done markers). Remember the name
+# alongside the directory's mtime: creating, renaming or removing any file bumps
+# it, so one stat tells whether the answer can still be trusted, in any worker.
+LEAGUE_DB_FILENAME_CACHE = {} # league_id -> (data_dir_mtime_ns, filename)
+LEAGUE_DB_FILENAME_CACHE_LOCK = threading.Lock()
+
+
+def _find_league_db_filename(league_id):
+    """Returns the filename of the league's database in DATA_DIR, or None if it hasn't been built yet."""
+    try:
+        dir_mtime = os.stat(DATA_DIR).st_mtime_ns
+    except OSError:
+        dir_mtime = None
+    with LEAGUE_DB_FILENAME_CACHE_LOCK:
+        cached = LEAGUE_DB_FILENAME_CACHE.get(league_id)
+    if cached and dir_mtime is not None and cached[0] == dir_mtime:
+        return cached[1]
+
+    entry = _find_league_db_entry(league_id)
+    if entry is None:
+        # Not cached: a DB created within the directory's mtime granularity
+        # would otherwise stay invisible.
+        return None
+    if dir_mtime is not None:
+        with LEAGUE_DB_FILENAME_CACHE_LOCK:
+            LEAGUE_DB_FILENAME_CACHE[league_id] = (dir_mtime, entry.name)
+    return entry.name
+
+
+def _session_user_key():
+    """Identifies the Yahoo user behind the current session."""
+    token = session.get('yahoo_token', {})
+    return token.get('xoauth_yahoo_guid') or token.get('refresh_token')
+
+
+def _yahoo_query_cache_key(query_str):
+    """Builds a per-user, per-league cache key so cached results never cross users."""
+    return (_session_user_key(), session.get('league_id'), query_str)
+
+
+def _take_yahoo_rate_token():
+    """
+    Takes one request token from the current user's bucket. Returns the number
+    of seconds to wait when the bucket is empty, or 0 if the call may proceed.
+    """
+    user = _session_user_key() or request.remote_addr
+    refill_per_second = YAHOO_RATE_LIMIT_PER_MINUTE / 60
+    now = time.monotonic()
+    with YAHOO_RATE_BUCKETS_LOCK:
+        if len(YAHOO_RATE_BUCKETS) > 1024:
+            # Forget users whose bucket has refilled completely anyway.
+            full_after = YAHOO_RATE_LIMIT_BURST / refill_per_second
+            for key in [k for k, (_, last) in YAHOO_RATE_BUCKETS.items() if now - last >= full_after]:
+                del YAHOO_RATE_BUCKETS[key]
+        tokens, last = YAHOO_RATE_BUCKETS.get(user, (YAHOO_RATE_LIMIT_BURST, now))
+        tokens = min(YAHOO_RATE_LIMIT_BURST, tokens + (now - last) * refill_per_second)
+        if tokens < 1:
+            YAHOO_RATE_BUCKETS[user] = (tokens, now)
+            return (1 - tokens) / refill_per_second
+        YAHOO_RATE_BUCKETS[user] = (tokens - 1, now)
+        return 0
+
+
+def _rate_limited_response(retry_after):
+    response = jsonify({"error": "Too many Yahoo requests. Please wait a moment and try again."})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(int(retry_after) + 1)
+    return response
+
+
+def _get_cached_yahoo_result(key):
+    """Returns a cached Yahoo query result, or None if missing or expired."""
+    with YAHOO_QUERY_CACHE_LOCK:
+        entry = YAHOO_QUERY_CACHE.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del YAHOO_QUERY_CACHE[key]
+            return None
+        entry[2] += 1
+        return entry[1]
+
+
+def _set_cached_yahoo_result(key, result):
+    """Stores a Yahoo query result, dropping expired entries and, when full, the least used."""
+    now = time.time()
+    with YAHOO_QUERY_CACHE_LOCK:
+        for stale_key in [k for k, entry in YAHOO_QUERY_CACHE.items() if entry[0] <= now]:
+            del YAHOO_QUERY_CACHE[stale_key]
+        while len(YAHOO_QUERY_CACHE) >= YAHOO_QUERY_CACHE_MAX_ENTRIES:
+            del YAHOO_QUERY_CACHE[min(YAHOO_QUERY_CACHE, key=lambda k: YAHOO_QUERY_CACHE[k][2])]
+        YAHOO_QUERY_CACHE[key] = [now + YAHOO_QUERY_CACHE_TTL, result, 0]
+
+
+# --- NEW: Pooled league DB connections ---
+# Opening a league DB re-reads the header, rebuilds the schema cache and starts
+# with a cold page cache on every request. Connections are instead kept per DB
+# path and handed back to the pool when the route calls close(). A rebuild can
+# replace the DB file, so the pool for a league is dropped around each build.
+# Builds in another worker can't reach this process's pool, so every checkout
+# also compares the file on disk with the one the connection opened: a
+# connection still reading a replaced (unlinked) file is closed, not reused.
+SQLITE_POOL = {} # db_path -> [idle PooledConnection, ...]
+SQLITE_POOL_GENERATIONS = {} # db_path -> generation, bumped on invalidation
+SQLITE_POOL_LOCK = threading.Lock()
+SQLITE_POOL_MAX_IDLE = 4 # per DB file
+SQLITE_CACHE_SIZE_KIB = 20000
+# sqlite3 keeps each connection's prepared statements in an LRU keyed by the
+# SQL text, so a pooled connection skips the parse/plan step on repeat queries.
+# The routes issue ~90 distinct statements; leave headroom over the default 128
+# so a full tour of the app doesn't cycle the LRU and evict everything.
+SQLITE_CACHED_STATEMENTS = 256
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() returns it to SQLITE_POOL while still valid."""
+
+    def close(self):
+        pool_key = getattr(self, 'pool_key', None)
+        if pool_key is not None:
+            if self.checkout is None:
+                return # Already back in the pool (or closed); don't hand it out twice.
+            self.checkout = None
+            if self.in_transaction:
+                self.rollback()
+            with SQLITE_POOL_LOCK:
+                idle = SQLITE_POOL.setdefault(pool_key, [])
+                if (self.pool_generation == SQLITE_POOL_GENERATIONS.get(pool_key, 0)
+                        and len(idle) < SQLITE_POOL_MAX_IDLE):
+                    idle.append(self)
+                    return
+        super().close()
+
+
+def _league_db_version(db_path):
+    """
+    Identifies the DB file on disk and its last write: (st_dev, st_ino) change
+    when a build replaces the file, the mtimes when one writes it in place
+    (WAL commits land in the -wal file until the final checkpoint).
+    """
+    st = os.stat(db_path)
+    try:
+        wal = os.stat(db_path + '-wal')
+        wal_marker = (wal.st_mtime_ns, wal.st_size)
+    except FileNotFoundError:
+        wal_marker = None
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, wal_marker)
+
+
+def _get_pooled_connection(db_path):
+    """Takes an idle connection to db_path from the pool, or opens and tunes a new one."""
+    # Stat before connecting: if the file is swapped in between, the connection
+    # is recorded against the old file and simply replaced on its next checkout.
+    db_version = _league_db_version(db_path)
+    file_id = db_version[:2]
+    with SQLITE_POOL_LOCK:
+        idle = SQLITE_POOL.get(db_path, [])
+        replaced = [c for c in idle if c.file_id != file_id]
+        if replaced:
+            idle[:] = [c for c in idle if c.file_id == file_id]
+        conn = idle.pop() if idle else None
+        generation = SQLITE_POOL_GENERATIONS.get(db_path, 0)
+    for stale in replaced:
+        sqlite3.Connection.close(stale)
+    if conn is None:
+        conn = _open_pooled_connection(db_path, generation)
+        conn.file_id = file_id
+    conn.db_version = db_version
+    # --- NEW: Return request checkouts on teardown ---
+    # Routes close their connection when done, but one that raises before its
+    # try/finally would drop it instead. The token ties the teardown to this
+    # checkout, so a connection already returned and handed to another request
+    # isn't closed out from under it.
+    conn.checkout = object()
+    if has_request_context():
+        g.setdefault('sqlite_checkouts', []).append((conn, conn.checkout))
+    return conn
+
+
+def _open_pooled_connection(db_path, generation):
+    """Opens and tunes a new read-only connection for SQLITE_POOL."""
+    # The API only ever reads league DBs, so open them read-only: no journal
+    # file is created and a stray write can't take the writer lock a build needs.
+    conn = sqlite3.connect(f"file:{quote(db_path)}?mode=ro", uri=True, factory=PooledConnection, check_same_thread=False,
+                           cached_statements=SQLITE_CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.pool_key = db_path
+    conn.pool_generation = generation
+    return conn
+
+
+@app.teardown_appcontext
+def release_sqlite_checkouts(exc):
+    for conn, checkout in g.pop('sqlite_checkouts', []):
+        if conn.checkout is checkout:
+            conn.close()
+
+
+def _invalidate_league_db_pool(league_id):
+    """Closes idle pooled connections for a league; in-use ones close when released."""
+    prefix = os.path.join(DATA_DIR, f"yahoo-{league_id}-")
+    with SQLITE_POOL_LOCK:
+        stale = []
+        for db_path in [p for p in set(SQLITE_POOL) | set(SQLITE_POOL_GENERATIONS) if p.startswith(prefix)]:
+            SQLITE_POOL_GENERATIONS[db_path] = SQLITE_POOL_GENERATIONS.get(db_path, 0) + 1
+            stale.extend(SQLITE_POOL.pop(db_path, []))
+    for conn in stale:
+        sqlite3.Connection.close(conn)
+    with LEAGUE_DB_STATIC_ROWS_LOCK:
+        for key in [k for k in LEAGUE_DB_STATIC_ROWS if k[0].startswith(prefix)]:
+            del LEAGUE_DB_STATIC_ROWS[key]
+    with LEAGUE_DB_FILENAME_CACHE_LOCK:
+        LEAGUE_DB_FILENAME_CACHE.pop(league_id, None)
+
+
+# --- NEW: Static league-table memo ---
+# scoring and lineup_settings are only written by a DB build, yet several
+# routes re-read them on every request. Keep their rows per version of the DB
+# file (see _league_db_version), so a build in any worker, whether it replaces
+# the file or rewrites it in place, misses the memo on the next request.
+LEAGUE_DB_STATIC_ROWS = {} # (db_path, db_version, sql) -> rows
+LEAGUE_DB_STATIC_ROWS_LOCK = threading.Lock()
+
+
+def _static_league_rows(cursor, sql):
+    """Returns the rows for a query over a build-only table, memoized per DB file version."""
+    conn = cursor.connection
+    key = (conn.pool_key, conn.db_version, sql)
+    with LEAGUE_DB_STATIC_ROWS_LOCK:
+        rows = LEAGUE_DB_STATIC_ROWS.get(key)
+    if rows is None:
+        # The query runs after the checkout's stat, so these rows are never
+        # older than the version they're stored under.
+        rows = cursor.execute(sql).fetchall()
+        with LEAGUE_DB_STATIC_ROWS_LOCK:
+            for stale_key in [k for k in LEAGUE_DB_STATIC_ROWS if k[0] == key[0] and k[1] != key[1]]:
+                del LEAGUE_DB_STATIC_ROWS[stale_key]
+            LEAGUE_DB_STATIC_ROWS[key] = rows
+    return rows
+
+
+# --- NEW: Per-league page bootstrap cache ---
+# The *_page_data endpoints are hit on every page navigation but only change
+# when the league DB is rebuilt (or the day rolls over, for current_week).
+# Cache their encoded bodies per league, day and version of the DB file (see
+# _league_db_version), so a build finished by any worker is seen on the next
+# request. Browsers revalidate against the same version through the ETag.
+PAGE_DATA_CACHE_TTL = 300 # seconds
+PAGE_DATA_CACHE = {} # (endpoint, league_id, date, db_version) -> (expires_at, body)
+PAGE_DATA_CACHE_LOCK = threading.Lock()
+
+
+def _league_page_data_version(league_id):
+    """Current _league_db_version of the league's DB, or None if there isn't one."""
+    db_filename = _find_league_db_filename(league_id)
+    if not db_filename:
+        return None
+    try:
+        return _league_db_version(os.path.join(DATA_DIR, db_filename))
+    except FileNotFoundError:
+        return None
+
+
+def _revalidated_page_data(response, etag):
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def cache_league_page_data(view):
+    """Caches a page-data view's successful JSON per league; ?refresh=1 bypasses it."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        league_id = session.get('league_id')
+        db_version = league_id and not session.get('use_test_db') and _league_page_data_version(league_id)
+        if not db_version:
+            return view(*args, **kwargs)
+        key = (view.__name__, league_id, date.today().isoformat(), db_version)
+        etag = hashlib.md5(repr(key).encode()).hexdigest()
+        now = time.time()
+        if request.args.get('refresh') != '1':
+            # Flask-Compress sends the ETag back as "<etag>:<algo>".
+            if etag in {tag.split(':', 1)[0] for tag in request.if_none_match.as_set()}:
+                return _revalidated_page_data(app.response_class(status=304), etag)
+            with PAGE_DATA_CACHE_LOCK:
+                entry = PAGE_DATA_CACHE.get(key)
+            if entry and entry[0] > now:
+                return _revalidated_page_data(json_body_response(entry[1]), etag)
+
+        response = app.make_response(view(*args, **kwargs))
+        if response.status_code == 200 and response.is_json and response.json.get('db_exists'):
+            with PAGE_DATA_CACHE_LOCK:
+                for stale_key in [k for k, e in PAGE_DATA_CACHE.items() if e[0] <= now]:
+                    del PAGE_DATA_CACHE[stale_key]
+                PAGE_DATA_CACHE[key] = (now + PAGE_DATA_CACHE_TTL, response.get_data())
+            _revalidated_page_data(response, etag)
+        return response
+    return wrapper
+
+
+def _invalidate_league_page_data(league_id):
+    """Drops cached page-data bodies for a league."""
+    with PAGE_DATA_CACHE_LOCK:
+        for key in [k for k in PAGE_DATA_CACHE if k[1] == league_id]:
+            del PAGE_DATA_CACHE[key]
 
 
 def get_db_connection_for_league(league_id):
     """Finds and connects to the league's database. Uses a test DB if configured."""
     if session.get('use_test_db'):
         logging.info(f"Using test database: {TEST_DB_PATH}")
-        if not os.path.exists(TEST_DB_PATH):
+        if not TEST_DB_EXISTS:
             return None, f"Test database '{TEST_DB_FILENAME}' not found in 'server' directory."
         try:
-            writable_test_db_path = os.path.join(DATA_DIR, f"temp_{TEST_DB_FILENAME}")
-            shutil.copy2(TEST_DB_PATH, writable_test_db_path)
-            conn = sqlite3.connect(writable_test_db_path)
-            conn.row_factory = sqlite3.Row
-            logging.info(f"Successfully connected to temporary copy of test DB.")
-            return conn, None
+            # --- MODIFIED: The API never writes league DBs and pooled connections
+            # are read-only, so pool the bundled test DB in place instead of
+            # copying the whole file and reconnecting on every request. ---
+            return _get_pooled_connection(TEST_DB_PATH), None
         except Exception as e:
             logging.error(f"Error connecting to test DB at {TEST_DB_PATH}: {e}")
             return None, "Could not connect to the test database."
@@ -192,20 +1088,13 @@ def get_db_connection_for_league(league_id):
     if not league_id:
         return None, "League ID not found in session."
 
-    db_filename = None
-    for filename in os.listdir(DATA_DIR):
-        if filename.startswith(f"yahoo-{league_id}-") and filename.endswith(".db"):
-            db_filename = filename
-            break
-
+    db_filename = _find_league_db_filename(league_id)
     if not db_filename:
         return None, "Database file not found. Please initialize it on the 'League Database' page."
 
     db_path = os.path.join(DATA_DIR, db_filename)
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn, None
+        return _get_pooled_connection(db_path), None
     except Exception as e:
         logging.error(f"Error connecting to DB at {db_path}: {e}")
         return None, "Could not connect to the database."
@@ -220,6 +1109,22 @@ def decode_dict_values(data):
     return data
 
 
+def iter_decoded_dicts(cursor):
+    """Yields decode_dict_values(dict(row)) for each remaining row, building one dict per row."""
+    columns = [column[0] for column in cursor.description]
+    for row in cursor:
+        yield {k: v.decode('utf-8') if isinstance(v, bytes) else v for k, v in zip(columns, row)}
+
+
+def fetch_decoded_dicts(cursor):
+    """
+    Same result as decode_dict_values([dict(row) for row in cursor.fetchall()]),
+    but the dicts are built straight off the cursor in one pass, without the
+    intermediate Row list and undecoded dict copies.
+    """
+    return list(iter_decoded_dicts(cursor))
+
+
 def _get_daily_simulated_roster(base_roster, simulated_moves, day_str):
     """
     Calculates the correct active roster for a given day, applying all
@@ -251,6 +1156,15 @@ def _get_daily_simulated_roster(base_roster, simulated_moves, day_str):
     return daily_active_roster
 
 
+@functools.lru_cache(maxsize=512)
+def _split_positions(pos_str):
+    """
+    Parses an eligible-positions string ('C,LW,Util') into a tuple of slots.
+    Rosters repeat the same handful of strings, so each is only split once.
+    """
+    return tuple(pos.strip() for pos in pos_str.split(','))
+
+
 def get_optimal_lineup(players, lineup_settings):
     """
     Calculates the optimal lineup using a three-pass greedy algorithm that prioritizes
@@ -286,13 +1200,16 @@ def get_optimal_lineup(players, lineup_settings):
     def get_pos_str(p):
         return p.get('eligible_positions') or p.get('positions', '')
 
+    def get_positions(p):
+        return _split_positions(get_pos_str(p))
+
     # --- Pass 1: Place players with only one eligible position ---
     single_pos_players = sorted(
-        [p for p in player_pool if len(get_pos_str(p).split(',')) == 1],
+        [p for p in player_pool if len(get_positions(p)) == 1],
         key=lambda p: p['total_rank']
     )
     for player in single_pos_players:
-        pos = get_pos_str(player).strip()
+        pos = get_positions(player)[0]
         if pos in lineup and len(lineup[pos]) < lineup_settings.get(pos, 0):
             # Use the new ID-based set
             assign_player(player, pos, lineup, assigned_player_ids)
@@ -303,7 +1220,7 @@ def get_optimal_lineup(players, lineup_settings):
     # --- Pass 2: Place multi-position players using a scarcity-aware algorithm ---
     player_pool.sort(key=lambda p: p['total_rank'])
     for player in player_pool:
-        eligible_positions = [pos.strip() for pos in get_pos_str(player).split(',')]
+        eligible_positions = get_positions(player)
         available_slots_for_player = [
             pos for pos in eligible_positions if pos in lineup and len(lineup[pos]) < lineup_settings.get(pos, 0)
         ]
@@ -315,7 +1232,7 @@ def get_optimal_lineup(players, lineup_settings):
             scarcity_count = sum(1 for other in player_pool
                                      if other != player and
                                      other.get('player_id') not in assigned_player_ids and
-                                     slot in [p.strip() for p in get_pos_str(other).split(',')])
+                                     slot in get_positions(other))
             slot_scarcity[slot] = scarcity_count
 
         best_pos = min(slot_scarcity, key=slot_scarcity.get)
@@ -328,7 +1245,7 @@ def get_optimal_lineup(players, lineup_settings):
     # --- Pass 3: Upgrade Pass ---
     # (This pass is unaffected as it doesn't use the assigned_set)
     for benched_player in player_pool:
-        for pos in [p.strip() for p in get_pos_str(benched_player).split(',')]:
+        for pos in get_positions(benched_player):
             if pos not in lineup: continue
 
             if not lineup[pos]: continue
@@ -340,7 +1257,7 @@ def get_optimal_lineup(players, lineup_settings):
                 lineup[pos].append(benched_player)
 
                 is_re_slotted = False
-                for other_pos in [p.strip() for p in get_pos_str(worst_starter_in_pos).split(',')]:
+                for other_pos in get_positions(worst_starter_in_pos):
                     if other_pos in lineup and len(lineup[other_pos]) < lineup_settings.get(other_pos, 0):
                         lineup[other_pos].append(worst_starter_in_pos)
                         is_re_slotted = True
@@ -376,25 +1293,27 @@ def _get_ranked_roster_for_week(cursor, team_id, week_num):
         JOIN players p ON rp.player_id = p.player_id
         WHERE r.team_id = ?
     """, (team_id,))
-    players_raw = cursor.fetchall()
-    players = decode_dict_values([dict(row) for row in players_raw])
+    players = fetch_decoded_dicts(cursor)
 
     # Get scoring categories
-    cursor.execute("SELECT category FROM scoring")
-    scoring_categories = [row['category'] for row in cursor.fetchall()]
+    scoring_categories = [row['category'] for row in _static_league_rows(cursor, "SELECT category FROM scoring")]
     cat_rank_columns = [f"{cat}_cat_rank" for cat in scoring_categories]
 
-    # Get schedules
+    # --- MODIFIED: Get schedules for every roster team in one query, not one per player ---
+    cursor.execute(
+        "SELECT team_tricode, schedule_json FROM team_schedules WHERE team_tricode IN (SELECT value FROM json_each(?))",
+        (json.dumps(list({player['team'] for player in players})),)
+    )
+    games_this_week = {}
+    for row in cursor.fetchall():
+        if row['team_tricode'] in games_this_week:
+            continue
+        games_this_week[row['team_tricode']] = [
+            game_date_str for game_date_str in orjson.loads(row['schedule_json'] or '[]')
+            if start_date <= datetime.strptime(game_date_str, '%Y-%m-%d').date() <= end_date
+        ]
     for player in players:
-        cursor.execute("SELECT schedule_json FROM team_schedules WHERE team_tricode = ?", (player['team'],))
-        schedule_row = cursor.fetchone()
-        player['game_dates_this_week'] = []
-        if schedule_row and schedule_row['schedule_json']:
-            schedule = json.loads(schedule_row['schedule_json'])
-            for game_date_str in schedule:
-                game_date = datetime.strptime(game_date_str, '%Y-%m-%d').date()
-                if start_date <= game_date <= end_date:
-                    player['game_dates_this_week'].append(game_date_str)
+        player['game_dates_this_week'] = list(games_this_week.get(player['team'], []))
 
     # Filter out IR players
     active_players = [p for p in players if not any(pos.strip().startswith('IR') for pos in p['eligible_positions'].split(','))]
@@ -402,13 +1321,12 @@ def _get_ranked_roster_for_week(cursor, team_id, week_num):
 
     # Get player stats and calculate total rank
     if normalized_names:
-        placeholders = ','.join('?' for _ in normalized_names)
         query = f"""
             SELECT player_name_normalized, {', '.join(cat_rank_columns)}
             FROM joined_player_stats
-            WHERE player_name_normalized IN ({placeholders})
+            WHERE player_name_normalized IN (SELECT value FROM json_each(?))
         """
-        cursor.execute(query, normalized_names)
+        cursor.execute(query, (json.dumps(normalized_names),))
         player_stats = {row['player_name_normalized']: dict(row) for row in cursor.fetchall()}
 
         for player in active_players:
@@ -501,8 +1419,6 @@ def _get_ranked_players(cursor, player_ids, cat_rank_columns, week_num):
         start_date_next = datetime.strptime(week_dates_next['start_date'], '%Y-%m-%d').date()
         end_date_next = datetime.strptime(week_dates_next['end_date'], '%Y-%m-%d').date()
 
-    placeholders = ','.join('?' for _ in player_ids)
-
     # --- START MODIFICATION ---
     # Construct the full list of columns to select
     base_columns = ['player_id', 'player_name', 'player_team', 'positions', 'status', 'player_name_normalized']
@@ -526,54 +1442,105 @@ def _get_ranked_players(cursor, player_ids, cat_rank_columns, week_num):
     columns_to_select = base_columns + cat_rank_columns + pp_stat_columns
     # --- END MODIFICATION ---
 
+    # Bucket each team's schedule into this/next week once. Free agent lists
+    # are hundreds of players from ~32 teams, so this replaces a query, a JSON
+    # parse and a date parse per game for every single player.
+    team_games = {}
+    cursor.execute("SELECT team_tricode, schedule_json FROM team_schedules")
+    for team_tricode, schedule_json in cursor.fetchall():
+        if team_tricode in team_games:
+            continue
+        games_this_week, games_next_week, game_dates_this_week_full = [], [], []
+        if schedule_json:
+            for game_date_str in orjson.loads(schedule_json):
+                game_date = date.fromisoformat(game_date_str)
+                if start_date and end_date and start_date <= game_date <= end_date:
+                    games_this_week.append(game_date.strftime('%a'))
+                    game_dates_this_week_full.append(game_date_str)
+                if start_date_next and end_date_next and start_date_next <= game_date <= end_date_next:
+                    games_next_week.append(game_date.strftime('%a'))
+        team_games[team_tricode] = (games_this_week, games_next_week, game_dates_this_week_full)
+
     query = f"""
         SELECT {', '.join(columns_to_select)}
         FROM joined_player_stats
-        WHERE player_id IN ({placeholders})
+        WHERE player_id IN (SELECT value FROM json_each(?))
     """
-    cursor.execute(query, player_ids)
-    players_raw = cursor.fetchall()
-    players = decode_dict_values([dict(row) for row in players_raw])
+    cursor.execute(query, (json.dumps(player_ids),))
 
-    # Calculate total rank and add schedules
-    for player in players:
+    # Build each player straight from the cursor rather than materializing the
+    # Row list and a second list of dicts first.
+    players = []
+    no_games = ([], [], [])
+    for player in iter_decoded_dicts(cursor):
+
+        # Calculate total rank and add schedules
         total_rank = sum(player.get(col, 0) or 0 for col in cat_rank_columns)
         player['total_cat_rank'] = round(total_rank, 2)
 
-        # Get schedules
-        player['games_this_week'] = []
-        player['games_next_week'] = []
-        player['game_dates_this_week_full'] = []
-        cursor.execute("SELECT schedule_json FROM team_schedules WHERE team_tricode = ?", (player.get('player_team'),))
-        schedule_row = cursor.fetchone()
-        if schedule_row and schedule_row['schedule_json']:
-            schedule = json.loads(schedule_row['schedule_json'])
-            for game_date_str in schedule:
-                game_date = datetime.strptime(game_date_str, '%Y-%m-%d').date()
-                if start_date and end_date and start_date <= game_date <= end_date:
-                    player['games_this_week'].append(game_date.strftime('%a'))
-                    player['game_dates_this_week_full'].append(game_date_str)
-                if start_date_next and end_date_next and start_date_next <= game_date <= end_date_next:
-                    player['games_next_week'].append(game_date.strftime('%a'))
+        games_this_week, games_next_week, game_dates_this_week_full = team_games.get(player.get('player_team'), no_games)
+        player['games_this_week'] = list(games_this_week)
+        player['games_next_week'] = list(games_next_week)
+        player['game_dates_this_week_full'] = list(game_dates_this_week_full)
+        players.append(player)
 
     return players
 
 
+# --- NEW: Pre-rendered pages ---
+# The page templates take no per-request context (only url_for('static')), so
+# each one is rendered once per process and served from memory with an ETag;
+# browsers revalidate and get a 304 instead of the page. The br/gzip bodies are
+# made once too (at max quality, since it's a one-off), so Flask-Compress
+# doesn't recompress the same HTML on every 200. ETags follow its "<etag>:<algo>" form.
+RENDERED_PAGE_CACHE = {} # template name -> (body, etag, {encoding: body})
+
+
+def render_cached_page(template_name):
+    """Returns a template's HTML as a conditional Response, rendering it once (every time in debug)."""
+    cached = RENDERED_PAGE_CACHE.get(template_name)
+    if cached is None or app.debug:
+        body = render_template(template_name).encode('utf-8')
+        cached = (body, hashlib.md5(body).hexdigest(), {
+            'br': brotli.compress(body, quality=11),
+            'gzip': gzip.compress(body, compresslevel=9),
+        })
+        RENDERED_PAGE_CACHE[template_name] = cached
+    body, etag, encoded = cached
+    encoding = request.accept_encodings.best_match(('br', 'gzip'))
+    if encoding:
+        response = app.response_class(encoded[encoding], mimetype='text/html')
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f"{etag}:{encoding}")
+    else:
+        response = app.response_class(body, mimetype='text/html')
+        response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 @app.route('/healthz')
 def health_check():
     return "OK", 200
 
 @app.route('/')
 def index():
-    if 'yahoo_token' in session:
-        return redirect(url_for('home'))
-    return render_template('index.html')
+    if _has_logged_in_cookie():
+        response = redirect(url_for('home'))
+    else:
+        response = render_cached_page('index.html')
+    # Whether / redirects depends on the login cookie.
+    response.vary.add('Cookie')
+    return response
 
 @app.route('/home')
 def home():
     if 'yahoo_token' not in session:
-        return redirect(url_for('index'))
-    return render_template('home.html')
+        response = redirect(url_for('index'))
+        response.delete_cookie(LOGGED_IN_COOKIE)
+        return response
+    return render_cached_page('home.html')
 
 @app.route('/login', methods=['POST'])
 def login():
@@ -591,22 +1558,25 @@ def login():
             'expires_at': time.time() + 3600
         }
         logging.info("Developer login successful using code 99999. Using test DB.")
-        return jsonify({'dev_login': True, 'redirect_url': url_for('home')})
+        response = jsonify({'dev_login': True, 'redirect_url': url_for('home')})
+        return _set_logged_in_cookie(response)
     # --- [END] DEV CODE BYPASS ---
 
+    # The consumer credentials are read from the environment once at import and
+    # used directly, rather than being copied into every user's session.
     session['league_id'] = league_id
-    session['consumer_key'] = os.environ.get("YAHOO_CONSUMER_KEY")
-    session['consumer_secret'] = os.environ.get("YAHOO_CONSUMER_SECRET")
 
-    if not all([session['league_id'], session['consumer_key'], session['consumer_secret']]):
-        if not session['consumer_key'] or not session['consumer_secret']:
+    if not all([league_id, YAHOO_CONSUMER_KEY, YAHOO_CONSUMER_SECRET]):
+        if not YAHOO_CONSUMER_KEY or not YAHOO_CONSUMER_SECRET:
             logging.error("YAHOO_CONSUMER_KEY or YAHOO_CONSUMER_SECRET not set.")
             return jsonify({"error": "Server is not configured correctly."}), 500
         return jsonify({"error": "League ID is required."}), 400
 
+    # Only the redirect URI (which follows the request host) and the state
+    # vary per login; the rest of the query string is precomputed.
     redirect_uri = url_for('callback', _external=True, _scheme='https')
-    yahoo = OAuth2Session(session['consumer_key'], redirect_uri=redirect_uri)
-    authorization_url, state = yahoo.authorization_url(authorization_base_url)
+    state = generate_token()
+    authorization_url = f"{YAHOO_AUTH_URL_PREFIX}&redirect_uri={quote(redirect_uri, safe='')}&state={state}"
     session['oauth_state'] = state
     return jsonify({'auth_url': authorization_url})
 
@@ -620,41 +1590,69 @@ def callback():
         return '<h1>Error: State mismatch.</h1>', 400
 
     redirect_uri = url_for('callback', _external=True, _scheme='https')
-    yahoo = OAuth2Session(session['consumer_key'], state=session.get('oauth_state'), redirect_uri=redirect_uri)
+    yahoo = OAuth2Session(YAHOO_CONSUMER_KEY, state=session.get('oauth_state'), redirect_uri=redirect_uri)
+    yahoo.mount('https://', YAHOO_LOGIN_ADAPTER)
 
     try:
         token = yahoo.fetch_token(
             token_url,
-            client_secret=session['consumer_secret'],
-            code=request.args.get('code')
+            client_secret=YAHOO_CONSUMER_SECRET,
+            code=request.args.get('code'),
+            timeout=YAHOO_TOKEN_TIMEOUT
         )
-        session['yahoo_token'] = token
+        session['yahoo_token'] = _session_token(token)
     except Exception as e:
         logging.error(f"Error fetching token: {e}", exc_info=True)
         return '<h1>Error: Could not fetch access token.</h1>', 500
 
-    return redirect(url_for('home'))
+    response = redirect(url_for('home'))
+    return _set_logged_in_cookie(response)
 
 @app.route('/logout')
 def logout():
+    token = session.get('yahoo_token') or {}
+    if token.get('access_token'):
+        with YFA_OAUTH_CACHE_LOCK:
+            YFA_OAUTH_CACHE.pop(hashlib.sha256(token['access_token'].encode()).hexdigest(), None)
     session.clear()
-    return redirect('/')
+    response = redirect('/')
+    response.delete_cookie(LOGGED_IN_COOKIE)
+    return response
+
+# Pretty-printed results shown in the query consoles. orjson indents like
+# json.dumps(indent=2) but serializes several times faster.
+CONSOLE_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
 
 @app.route('/query', methods=['POST'])
 def handle_query():
-    yq = get_yfpy_instance()
-    if not yq:
+    if 'yahoo_token' not in session:
         return jsonify({"error": "Could not connect to Yahoo API. Your session may have expired."}), 401
 
     query_str = request.get_json().get('query')
     if not query_str:
         return jsonify({"error": "No query provided."}), 400
 
+    # Serve repeat queries from the cache before touching the Yahoo API at all
+    cache_key = _yahoo_query_cache_key(query_str)
+    cached_result = _get_cached_yahoo_result(cache_key)
+    if cached_result is not None:
+        logging.info(f"Serving cached query: {query_str}")
+        return jsonify({"result": cached_result})
+
+    retry_after = _take_yahoo_rate_token()
+    if retry_after:
+        return _rate_limited_response(retry_after)
+
+    yq = get_yfpy_instance()
+    if not yq:
+        return jsonify({"error": "Could not connect to Yahoo API. Your session may have expired."}), 401
+
     logging.info(f"Executing query: {query_str}")
     try:
         result = eval(query_str, {"yq": yq})
         dict_result = model_to_dict(result)
-        json_result = json.dumps(dict_result, indent=2)
+        json_result = orjson.dumps(dict_result, option=CONSOLE_JSON_OPTIONS).decode()
+        _set_cached_yahoo_result(cache_key, json_result)
         return jsonify({"result": json_result})
     except Exception as e:
         logging.error(f"Query error: {e}", exc_info=True)
@@ -662,6 +1660,11 @@ def handle_query():
 
 @app.route('/yfa_query', methods=['POST'])
 def handle_yfa_query():
+    if 'yahoo_token' in session:
+        retry_after = _take_yahoo_rate_token()
+        if retry_after:
+            return _rate_limited_response(retry_after)
+
     lg = get_yfa_lg_instance()
     if not lg:
         return jsonify({"error": "Could not connect to Yahoo API. Your session may have expired."}), 401
@@ -673,7 +1676,7 @@ def handle_yfa_query():
     logging.info(f"Executing YFA query: {query_str}")
     try:
         result = eval(query_str, {"lg": lg})
-        pretty_result = json.dumps(result, indent=2)
+        pretty_result = orjson.dumps(result, option=CONSOLE_JSON_OPTIONS).decode()
         return jsonify({"result": pretty_result})
     except Exception as e:
         logging.error(f"YFA Query error: {e}", exc_info=True)
@@ -681,6 +1684,7 @@ def handle_yfa_query():
 
 
 @app.route('/api/matchup_page_data')
+@cache_league_page_data
 def matchup_page_data():
     league_id = session.get('league_id')
     conn, error_msg = get_db_connection_for_league(league_id)
@@ -693,19 +1697,19 @@ def matchup_page_data():
 
         # Fetch weeks
         cursor.execute("SELECT week_num, start_date, end_date FROM weeks ORDER BY week_num")
-        weeks = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        weeks = fetch_decoded_dicts(cursor)
 
         # Fetch teams
         cursor.execute("SELECT team_id, name FROM teams ORDER BY name")
-        teams = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        teams = fetch_decoded_dicts(cursor)
 
         # Fetch matchups
         cursor.execute("SELECT week, team1, team2 FROM matchups")
-        matchups = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        matchups = fetch_decoded_dicts(cursor)
 
         # Fetch scoring categories, ordered by group (offense, then goalie) then ID
         cursor.execute("SELECT category, stat_id, scoring_group FROM scoring ORDER BY scoring_group DESC, stat_id")
-        scoring_categories = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        scoring_categories = fetch_decoded_dicts(cursor)
 
         # Determine current week
         today = date.today().isoformat()
@@ -744,8 +1748,7 @@ def get_matchup_stats():
         return jsonify({'error': error_msg}), 404
 
     cursor = conn.cursor()
-    cursor.execute("SELECT category FROM scoring")
-    all_scoring_categories = [row['category'] for row in cursor.fetchall()]
+    all_scoring_categories = [row['category'] for row in _static_league_rows(cursor, "SELECT category FROM scoring")]
 
     checked_categories = data.get('categories')
     # Handle default case: if no categories are sent, all are checked
@@ -780,8 +1783,7 @@ def get_matchup_stats():
 
 
         # Get official scoring categories
-        cursor.execute("SELECT category FROM scoring")
-        scoring_categories = [row['category'] for row in cursor.fetchall()]
+        scoring_categories = [row['category'] for row in _static_league_rows(cursor, "SELECT category FROM scoring")]
 
         # Ensure all necessary sub-categories for calculations are included
         required_cats = {'SV', 'SA', 'GA', 'TOI/G'}
@@ -790,8 +1792,7 @@ def get_matchup_stats():
         # Categories to fetch from joined_player_stats (projections).
         projection_cats = list(set(all_categories_to_fetch) - {'TOI/G', 'SVpct'})
 
-        cursor.execute("SELECT position, position_count FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")
-        lineup_settings = {row['position']: row['position_count'] for row in cursor.fetchall()}
+        lineup_settings = {row['position']: row['position_count'] for row in _static_league_rows(cursor, "SELECT position, position_count FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")}
 
 
         # --- Calculate Live Stats ---
@@ -802,8 +1803,7 @@ def get_matchup_stats():
             GROUP BY team_id, category
         """, (start_date_str, end_date_str, team1_id, team2_id))
 
-        live_stats_raw = cursor.fetchall()
-        live_stats_decoded = decode_dict_values([dict(row) for row in live_stats_raw])
+        live_stats_decoded = fetch_decoded_dicts(cursor)
 
         stats = {
             'team1': {'live': {cat: 0 for cat in all_categories_to_fetch}, 'row': {}},
@@ -854,6 +1854,13 @@ def get_matchup_stats():
         today = date.today()
         projection_start_date = max(today, start_date_obj)
 
+        # Per-player projections don't depend on the day, so each starter's
+        # row is fetched once for the whole projection window and reused.
+        projection_query = f"SELECT player_id, {', '.join(projection_cats)} FROM joined_player_stats WHERE player_id IN (SELECT value FROM json_each(?))"
+        player_avg_stats = {}
+        queried_player_ids = set()
+        team_rows = (('team1', stats['team1']['row']), ('team2', stats['team2']['row']))
+
         current_date = projection_start_date
         while current_date <= end_date_obj:
             current_date_str = current_date.strftime('%Y-%m-%d')
@@ -878,37 +1885,24 @@ def get_matchup_stats():
             stats['game_counts']['team1_remaining'] += len(team1_starters)
             stats['game_counts']['team2_remaining'] += len(team2_starters)
 
-            all_starter_ids_today = [p['player_id'] for p in team1_starters + team2_starters]
-
-            if all_starter_ids_today:
-                placeholders = ','.join('?' for _ in all_starter_ids_today)
-                query = f"SELECT player_id, {', '.join(projection_cats)} FROM joined_player_stats WHERE player_id IN ({placeholders})"
-                cursor.execute(query, tuple(all_starter_ids_today))
-                player_avg_stats = {row['player_id']: dict(row) for row in cursor.fetchall()}
-
-                for starter in team1_starters:
-                    if starter['player_id'] in player_avg_stats:
-                        player_proj = player_avg_stats[starter['player_id']]
-                        for category in projection_cats:
-                            stat_val = player_proj.get(category) or 0
-                            stats['team1']['row'][category] += stat_val
-
-                        # Safely get position string from either key
-                        pos_str = starter.get('eligible_positions') or starter.get('positions', '')
-                        if 'G' in pos_str.split(','):
-                            stats['team1']['row']['TOI/G'] += 60
-
-                for starter in team2_starters:
-                    if starter['player_id'] in player_avg_stats:
-                        player_proj = player_avg_stats[starter['player_id']]
-                        for category in projection_cats:
-                            stat_val = player_proj.get(category) or 0
-                            stats['team2']['row'][category] += stat_val
-
-                        # Safely get position string from either key
-                        pos_str = starter.get('eligible_positions') or starter.get('positions', '')
-                        if 'G' in pos_str.split(','):
-                            stats['team2']['row']['TOI/G'] += 60
+            new_starter_ids = {p['player_id'] for p in team1_starters + team2_starters} - queried_player_ids
+            if new_starter_ids:
+                cursor.execute(projection_query, (json.dumps(list(new_starter_ids)),))
+                player_avg_stats.update((row['player_id'], dict(row)) for row in cursor.fetchall())
+                queried_player_ids |= new_starter_ids
+
+            for (team_key, row_stats), starters in zip(team_rows, (team1_starters, team2_starters)):
+                for starter in starters:
+                    player_proj = player_avg_stats.get(starter['player_id'])
+                    if player_proj is None:
+                        continue
+                    for category in projection_cats:
+                        row_stats[category] += player_proj.get(category) or 0
+
+                    # Safely get position string from either key
+                    pos_str = starter.get('eligible_positions') or starter.get('positions', '')
+                    if 'G' in _split_positions(pos_str):
+                        row_stats['TOI/G'] += 60
 
             current_date += timedelta(days=1)
 
@@ -964,6 +1958,7 @@ def get_matchup_stats():
             conn.close()
 
 @app.route('/api/lineup_page_data')
+@cache_league_page_data
 def lineup_page_data():
     league_id = session.get('league_id')
     conn, error_msg = get_db_connection_for_league(league_id)
@@ -976,11 +1971,11 @@ def lineup_page_data():
 
         # Fetch weeks
         cursor.execute("SELECT week_num, start_date, end_date FROM weeks ORDER BY week_num")
-        weeks = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        weeks = fetch_decoded_dicts(cursor)
 
         # Fetch teams
         cursor.execute("SELECT team_id, name FROM teams ORDER BY name")
-        teams = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        teams = fetch_decoded_dicts(cursor)
 
         # Determine current week
         today = date.today().isoformat()
@@ -1004,6 +1999,7 @@ def lineup_page_data():
 
 
 @app.route('/api/season_history_page_data')
+@cache_league_page_data
 def season_history_page_data():
     league_id = session.get('league_id')
     conn, error_msg = get_db_connection_for_league(league_id)
@@ -1016,11 +2012,11 @@ def season_history_page_data():
 
         # Fetch weeks
         cursor.execute("SELECT week_num, start_date, end_date FROM weeks ORDER BY week_num")
-        weeks = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        weeks = fetch_decoded_dicts(cursor)
 
         # Fetch teams
         cursor.execute("SELECT team_id, name FROM teams ORDER BY name")
-        teams = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        teams = fetch_decoded_dicts(cursor)
 
         # Determine current week
         today = date.today().isoformat()
@@ -1064,8 +2060,7 @@ def _get_live_matchup_stats(cursor, team1_id, team2_id, start_date_str, end_date
         GROUP BY team_id, category
     """, (start_date_str, end_date_str, team1_id, team2_id))
 
-    live_stats_raw = cursor.fetchall()
-    live_stats_decoded = decode_dict_values([dict(row) for row in live_stats_raw])
+    live_stats_decoded = fetch_decoded_dicts(cursor)
 
     stats = {
         'team1': {'live': {cat: 0 for cat in all_categories_to_fetch}},
@@ -1119,8 +2114,7 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
         # 1. Get data needed for simulation
 
         # Get lineup settings
-        cursor.execute("SELECT position FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")
-        starter_positions = {row['position'] for row in cursor.fetchall()} # e.g., {'C', 'LW', 'RW', 'D', 'G'}
+        starter_positions = {row['position'] for row in _static_league_rows(cursor, "SELECT position FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")} # e.g., {'C', 'LW', 'RW', 'D', 'G'}
         logging.info(f"Starter positions: {starter_positions}")
 
         # Create position mapping
@@ -1162,7 +2156,7 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
             ORDER BY 1, 2
         """, (team_id, start_date, end_date, team_id, start_date, end_date))
 
-        all_stats_raw = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        all_stats_raw = fetch_decoded_dicts(cursor)
 
         if not all_stats_raw:
             logging.warning("No daily_player_stats or daily_bench_stats found for optimization.")
@@ -1194,13 +2188,13 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
         logging.info(f"Simulating days: {week_dates}")
 
         for day in week_dates:
-            logging.info(f"--- Simulating Day: {day} ---")
+            logging.info("--- Simulating Day: %s ---", day)
             performances = daily_player_performances[day]
 
             starters = [p for p in performances.values() if p['lineup_pos'] in starter_positions]
             bench = [p for p in performances.values() if p['lineup_pos'] == 'BN' and sum(p['stats'].values()) > 0]
 
-            logging.info(f"Found {len(starters)} starters and {len(bench)} scoring bench players.")
+            logging.info("Found %d starters and %d scoring bench players.", len(starters), len(bench))
 
             if not bench or not starters:
                 logging.info("No bench players or starters, skipping day.")
@@ -1210,7 +2204,7 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
 
             # Iterate through each bench player
             for bench_player in bench:
-                logging.info(f"Evaluating bench player: {bench_player['player_name']} (Eligible: {bench_player['eligible_positions']})")
+                logging.debug("Evaluating bench player: %s (Eligible: %s)", bench_player['player_name'], bench_player['eligible_positions'])
                 best_swap = {
                     'starter_to_replace': None,
                     'net_gain_score': 0
@@ -1224,7 +2218,7 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
                         continue
 
                     if starter['lineup_pos'] not in bench_player['eligible_positions']:
-                        logging.debug(f"  -> Skipping {starter['player_name']}: Bench player not eligible for {starter['lineup_pos']}")
+                        logging.debug("  -> Skipping %s: Bench player not eligible for %s", starter['player_name'], starter['lineup_pos'])
                         continue
 
                     # This is a valid swap. Let's score it.
@@ -1256,7 +2250,7 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
 
                         current_swap_score += (new_points - current_points)
 
-                    logging.info(f"  -> vs {starter['player_name']} ({starter['lineup_pos']}): net score = {current_swap_score}")
+                    logging.debug("  -> vs %s (%s): net score = %s", starter['player_name'], starter['lineup_pos'], current_swap_score)
 
                     if current_swap_score > best_swap['net_gain_score']:
                         best_swap['net_gain_score'] = current_swap_score
@@ -1266,7 +2260,7 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
                 if best_swap['net_gain_score'] > 0 and best_swap['starter_to_replace']:
                     starter_to_replace = best_swap['starter_to_replace']
 
-                    logging.info(f"  ==> SWAP FOUND: {bench_player['player_name']} for {starter_to_replace['player_name']} (Score: {best_swap['net_gain_score']})")
+                    logging.info("  ==> SWAP FOUND: %s for %s (Score: %s)", bench_player['player_name'], starter_to_replace['player_name'], best_swap['net_gain_score'])
 
                     # --- START MODIFICATION ---
                     # Calculate and store the stat diffs for this specific swap
@@ -1292,10 +2286,10 @@ def _calculate_bench_optimization(cursor, team_id, week_num, start_date, end_dat
 
                     # 3. Apply the stat changes to our optimized totals
                     for cat, diff in stat_diffs.items():
-                        logging.info(f"    Applying {cat}: {optimized_stats[cat]:.1f} + ({diff:.1f}) = {optimized_stats[cat] + diff:.1f}")
+                        logging.debug("    Applying %s: %.1f + (%.1f) = %.1f", cat, optimized_stats[cat], diff, optimized_stats[cat] + diff)
                         optimized_stats[cat] += diff
                 else:
-                    logging.info(f"  -> No beneficial swap found for {bench_player['player_name']}.")
+                    logging.debug("  -> No beneficial swap found for %s.", bench_player['player_name'])
 
 
         # 4. Create the final optimized matchup data object
@@ -1439,7 +2433,7 @@ def get_bench_points_data():
 
         sql_query += " ORDER BY d.date_, p.player_name"
         cursor.execute(sql_query, tuple(sql_params))
-        raw_stats = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        raw_stats = fetch_decoded_dicts(cursor)
         logging.info(f"Found {len(raw_stats)} raw bench stat rows for table.")
 
         # Pivot the data
@@ -1555,7 +2549,7 @@ def get_transaction_history_data():
 
                 sql_query += " ORDER BY transaction_date, player_name"
                 cursor.execute(sql_query, tuple(sql_params))
-                return decode_dict_values([dict(row) for row in cursor.fetchall()])
+                return fetch_decoded_dicts(cursor)
 
             add_rows = fetch_transactions('add')
             drop_rows = fetch_transactions('drop')
@@ -1678,7 +2672,7 @@ def get_transaction_history_data():
                 ORDER BY fantasy_team, transaction_date, player_name
             """, (start_date, end_date))
 
-            all_adds = decode_dict_values([dict(row) for row in cursor.fetchall()])
+            all_adds = fetch_decoded_dicts(cursor)
             logging.info(f"Found {len(all_adds)} total adds for the league in week {week}.")
 
             # --- MODIFIED: league_data to hold skater/goalie lists ---
@@ -1825,7 +2819,7 @@ def _get_ranks_for_one_week(cursor, all_team_ids, selected_team_id, categories_t
         GROUP BY team_id, category
     """
     cursor.execute(sql_query, tuple(sql_params))
-    raw_stats = decode_dict_values([dict(row) for row in cursor.fetchall()])
+    raw_stats = fetch_decoded_dicts(cursor)
 
     # 4. Pivot data
     for row in raw_stats:
@@ -1959,7 +2953,7 @@ def get_category_strengths_data():
         sql_query += " GROUP BY team_id, category"
 
         cursor.execute(sql_query, tuple(sql_params))
-        raw_stats = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        raw_stats = fetch_decoded_dicts(cursor)
 
         # 5. Pivot data for *all* teams and recalculate derived stats
         all_team_stats = {
@@ -2146,6 +3140,7 @@ def get_category_strengths_data():
 
 
 @app.route('/api/schedules_page_data')
+@cache_league_page_data
 def schedules_page_data():
     """
     Provides the necessary data to populate the Schedules page.
@@ -2162,7 +3157,7 @@ def schedules_page_data():
 
         # Fetch all weeks (as requested for the schedules page)
         cursor.execute("SELECT week_num, start_date, end_date FROM weeks ORDER BY week_num")
-        weeks = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        weeks = fetch_decoded_dicts(cursor)
 
         return jsonify({
             'db_exists': True,
@@ -2211,10 +3206,10 @@ def schedules_off_days():
         off_days_set = set(row['off_day_date'] for row in cursor.fetchall())
 
         cursor.execute("SELECT week_num, start_date, end_date FROM weeks ORDER BY week_num")
-        weeks = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        weeks = fetch_decoded_dicts(cursor)
 
         cursor.execute("SELECT game_date, home_team, away_team FROM schedule")
-        schedule = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        schedule = fetch_decoded_dicts(cursor)
 
         # 2. Determine current week (Unchanged)
         today = date.today().isoformat()
@@ -2379,7 +3374,7 @@ def schedules_playoff_schedules():
 
         # 3. Get all weeks from the database
         cursor.execute("SELECT week_num, start_date, end_date FROM weeks ORDER BY week_num")
-        all_weeks = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        all_weeks = fetch_decoded_dicts(cursor)
 
         # 4. Filter to find the exact playoff weeks
         playoff_weeks = []
@@ -2405,7 +3400,7 @@ def schedules_playoff_schedules():
         off_days_set = set(row['off_day_date'] for row in cursor.fetchall())
 
         cursor.execute("SELECT game_date, home_team, away_team FROM schedule")
-        schedule = decode_dict_values([dict(row) for row in cursor.fetchall()])
+        schedule = fetch_decoded_dicts(cursor)
 
         # 5a. Fetch team standings data
         cursor.execute("SELECT team_tricode, point_pct, goals_against_per_game FROM team_standings")
@@ -2514,8 +3509,7 @@ def get_roster_data():
     try:
         cursor = conn.cursor()
 
-        cursor.execute("SELECT category FROM scoring")
-        all_scoring_categories = [row['category'] for row in cursor.fetchall()]
+        all_scoring_categories = [row['category'] for row in _static_league_rows(cursor, "SELECT category FROM scoring")]
 
         checked_categories = data.get('categories')
         if checked_categories is None:
@@ -2559,8 +3553,7 @@ def get_roster_data():
             JOIN players p ON rp.player_id = p.player_id
             WHERE r.team_id = ?
         """, (team_id,))
-        all_players_raw = cursor.fetchall()
-        all_players = decode_dict_values([dict(row) for row in all_players_raw])
+        all_players = fetch_decoded_dicts(cursor)
 
         if simulated_moves:
             dropped_player_ids = {int(m['dropped_player']['player_id']) for m in simulated_moves}
@@ -2572,8 +3565,7 @@ def get_roster_data():
 
 
         # Get scoring categories to fetch rank columns
-        cursor.execute("SELECT category FROM scoring")
-        scoring_categories = [row['category'] for row in cursor.fetchall()]
+        scoring_categories = [row['category'] for row in _static_league_rows(cursor, "SELECT category FROM scoring")]
         cat_rank_columns = [f"{cat}_cat_rank" for cat in scoring_categories]
 
         # --- [START] NEW: Define PP Stat columns ---
@@ -2597,16 +3589,14 @@ def get_roster_data():
 
         player_stats = {}
         if valid_normalized_names: # Only query if we have valid names
-            placeholders = ','.join('?' for _ in valid_normalized_names)
-
             # --- [START] MODIFIED: Add pp_stat_columns to query ---
             columns_to_select = cat_rank_columns + pp_stat_columns
             query = f"""
                 SELECT player_name_normalized, {', '.join(columns_to_select)}
-                FROM joined_player_stats WHERE player_name_normalized IN ({placeholders})
+                FROM joined_player_stats WHERE player_name_normalized IN (SELECT value FROM json_each(?))
             """
             # --- [END] MODIFIED ---
-            cursor.execute(query, valid_normalized_names) # Use the filtered list
+            cursor.execute(query, (json.dumps(valid_normalized_names),)) # Use the filtered list
             player_stats = {row['player_name_normalized']: dict(row) for row in cursor.fetchall()}
 
         # Augment the full player list with all necessary data
@@ -2664,7 +3654,7 @@ def get_roster_data():
                     cursor.execute("SELECT schedule_json FROM team_schedules WHERE team_tricode = ?", (player_team_tricode,))
                     schedule_row = cursor.fetchone()
                     if schedule_row and schedule_row['schedule_json']:
-                        schedule = json.loads(schedule_row['schedule_json'])
+                        schedule = orjson.loads(schedule_row['schedule_json'])
                         for game_date_str in schedule:
                             game_date = datetime.strptime(game_date_str, '%Y-%m-%d').date()
                             if start_date_next <= game_date <= end_date_next:
@@ -2691,8 +3681,7 @@ def get_roster_data():
         logging.info("Finished updating ranks for active_players.")
 
         # Get lineup settings
-        cursor.execute("SELECT position, position_count FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")
-        lineup_settings = {row['position']: row['position_count'] for row in cursor.fetchall()}
+        lineup_settings = {row['position']: row['position_count'] for row in _static_league_rows(cursor, "SELECT position, position_count FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")}
 
         # --- Calculate optimal lineup and starts for each day ---
         daily_optimal_lineups = {}
@@ -2760,8 +3749,7 @@ def get_free_agent_data():
         request_data = request.get_json(silent=True) or {}
 
         # Get all scoring categories from the database
-        cursor.execute("SELECT category FROM scoring")
-        all_scoring_categories = [row['category'] for row in cursor.fetchall()]
+        all_scoring_categories = [row['category'] for row in _static_league_rows(cursor, "SELECT category FROM scoring")]
 
         # Determine which categories are checked. If none are sent, assume all are.
         checked_categories = request_data.get('categories')
@@ -2852,8 +3840,7 @@ def get_free_agent_data():
                         if day >= today_obj:
                             days_in_week_data.append(day.isoformat())
 
-                    cursor.execute("SELECT position, position_count FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")
-                    lineup_settings = {row['position']: row['position_count'] for row in cursor.fetchall()}
+                    lineup_settings = {row['position']: row['position_count'] for row in _static_league_rows(cursor, "SELECT position, position_count FROM lineup_settings WHERE position NOT IN ('BN', 'IR', 'IR+')")}
 
                     # --- NEW: Use target_week ---
                     team_ranked_roster = _get_ranked_roster_for_week(cursor, team_id, target_week)
@@ -2864,8 +3851,7 @@ def get_free_agent_data():
                     # --- [END] THE FIX ---
 
         # Get all scoring categories for checkboxes
-        cursor.execute("SELECT category FROM scoring")
-        all_scoring_categories_for_checkboxes = [row['category'] for row in cursor.fetchall()]
+        all_scoring_categories_for_checkboxes = [row['category'] for row in _static_league_rows(cursor, "SELECT category FROM scoring")]
 
         return jsonify({
             'waiver_players': waiver_players,
@@ -2898,8 +3884,7 @@ def _get_team_goalie_stats(cursor, team_id, start_date_str, end_date_str):
         GROUP BY category
     """, (start_date_str, end_date_str, team_id, *goalie_categories))
 
-    live_stats_raw = cursor.fetchall()
-    live_stats_decoded = decode_dict_values([dict(row) for row in live_stats_raw])
+    live_stats_decoded = fetch_decoded_dicts(cursor)
 
     live_stats = {cat: 0 for cat in goalie_categories}
     for row in live_stats_decoded:
@@ -3015,84 +4000,28 @@ def get_goalie_planning_stats():
             conn.close()
 
 
-@app.route('/stream')
-def stream():
-    def event_stream():
-        while True:
-            message = log_queue.get()
-            if message is None:
-                break
-            yield f"data: {message}\n\n"
-    return Response(event_stream(), mimetype='text/event-stream')
-
-#def update_db_in_background(yq, lg, league_id, data_dir, capture_lineups, skip_static_info, skip_available_players):
-def update_db_in_background(yq, lg, league_id, data_dir, capture_lineups):
-    """Function to run in a separate thread."""
-    try:
-        db_builder.update_league_db(
-            yq, lg, league_id, data_dir,
-            capture_lineups=capture_lineups#,
-#            skip_static_info=skip_static_info,
-#            skip_available_players=skip_available_players
-        )
-        log_queue.put("SUCCESS: Database update complete.")
-    except Exception as e:
-        logging.error(f"Error in background DB update: {e}", exc_info=True)
-        log_queue.put(f"ERROR: {e}")
-    finally:
-        # Signal the end of the stream
-        log_queue.put(None)
-
-@app.route('/api/update_db', methods=['POST'])
-def update_db_route():
-    if session.get('dev_mode'):
-        return jsonify({'success': False, 'error': 'Database updates are disabled in dev mode.'}), 403
-
-    yq = get_yfpy_instance()
-    lg = get_yfa_lg_instance()
-    if not yq or not lg:
-        return jsonify({"error": "Authentication failed. Please log in again."}), 401
-
-    league_id = session.get('league_id')
-    if not league_id:
-        return jsonify({'success': False, 'error': 'League ID not found in session.'}), 400
-
-    data = request.get_json() or {}
-    capture_lineups = data.get('capture_lineups', False)
-#    skip_static_info = data.get('skip_static_info', False)
-#    skip_available_players = data.get('skip_available_players', False)
-
-    # Run the database update in a background thread
-    thread = threading.Thread(
-        target=update_db_in_background,
-        args=(yq, lg, league_id, DATA_DIR, capture_lineups)#, skip_static_info, skip_available_players)
-    )
-    thread.start()
-
-    return jsonify({'success': True, 'message': 'Database update started.'})
-
-
 @app.route('/api/download_db')
 def download_db():
     if session.get('use_test_db'):
         logging.info(f"Downloading test database: {TEST_DB_FILENAME}")
-        if not os.path.exists(TEST_DB_PATH):
+        if not TEST_DB_EXISTS:
             return jsonify({'error': 'Test database file not found in /server directory.'}), 404
         return send_from_directory(SERVER_DIR, TEST_DB_FILENAME, as_attachment=True)
 
     league_id = session.get('league_id')
     if not league_id:
-        return jsonify({'error': 'Not logged in or session expired.'}), 401
-
-    db_filename = None
-    for filename in os.listdir(DATA_DIR):
-        if filename.startswith(f"yahoo-{league_id}-") and filename.endswith(".db"):
-            db_filename = filename
-            break
+        return json_body_response(DOWNLOAD_LOGGED_OUT_BODY, 401)
 
+    db_filename = _find_league_db_filename(league_id)
     if not db_filename:
         return jsonify({'error': 'Database file not found. Please create it on the "League Database" page first.'}), 404
 
+    if X_ACCEL_REDIRECT_PREFIX:
+        response = app.response_class(mimetype='application/octet-stream')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_REDIRECT_PREFIX + quote(db_filename)
+        response.headers.set('Content-Disposition', 'attachment', filename=db_filename)
+        return response
+
     try:
         return send_from_directory(DATA_DIR, db_filename, as_attachment=True)
     except Exception as e:
@@ -3104,7 +4033,7 @@ def api_settings():
     if request.method == 'GET':
         return jsonify({
             'use_test_db': session.get('use_test_db', False),
-            'test_db_exists': os.path.exists(TEST_DB_PATH)
+            'test_db_exists': TEST_DB_EXISTS
         })
     elif request.method == 'POST':
         data = request.get_json()
@@ -3112,12 +4041,15 @@ def api_settings():
 
         # Dev mode forces the test DB on, don't let it be turned off
         if session.get('dev_mode'):
-             session['use_test_db'] = True
-        else:
+            use_test_db = True
+
+        # Only write when the value changes; assigning marks the session
+        # modified, which re-signs the cookie (or rewrites the Redis entry).
+        if session.get('use_test_db', False) != use_test_db:
             session['use_test_db'] = use_test_db
 
-        logging.info(f"Test DB mode set to: {session['use_test_db']}")
-        return jsonify({'success': True, 'use_test_db': session['use_test_db']})
+        logging.info(f"Test DB mode set to: {use_test_db}")
+        return jsonify({'success': True, 'use_test_db': use_test_db})
 
 @app.route('/api/db_timestamp')
 def db_timestamp():
@@ -3161,43 +4093,40 @@ def available_players_timestamp():
 
 @app.route('/pages/<path:page_name>')
 def serve_page(page_name):
-    return render_template(f"pages/{page_name}")
+    return render_cached_page(f"pages/{page_name}")
 
 @app.route('/api/db_status')
 def db_status():
     if session.get('use_test_db'):
-        db_exists = os.path.exists(TEST_DB_PATH)
-        timestamp = os.path.getmtime(TEST_DB_PATH) if db_exists else None
         return jsonify({
-            'db_exists': db_exists,
+            'db_exists': TEST_DB_EXISTS,
             'league_name': f"TEST DB: {TEST_DB_FILENAME}",
-            'timestamp': int(timestamp) if timestamp else None,
+            'timestamp': int(TEST_DB_MTIME) if TEST_DB_MTIME else None,
             'is_test_db': True
         })
 
     league_id = session.get('league_id')
     if not league_id:
-        return jsonify({'db_exists': False, 'error': 'Not logged in.', 'is_test_db': False})
+        return json_body_response(DB_STATUS_LOGGED_OUT_BODY)
 
-    db_path = None
     league_name = "[Unknown]"
     timestamp = None
-    db_exists = False
-    db_filename = None
-
-    for filename in os.listdir(DATA_DIR):
-        if filename.startswith(f"yahoo-{league_id}-") and filename.endswith(".db"):
-            db_path = os.path.join(DATA_DIR, filename)
-            db_exists = True
-            db_filename = filename
-            break
+    # The page polls this while a build runs: resolve the file through the
+    # filename cache (one directory stat) and stat the DB itself once, rather
+    # than scanning DATA_DIR on every poll.
+    db_filename = _find_league_db_filename(league_id)
+    db_exists = db_filename is not None
 
     if db_exists:
         try:
             match = re.search(f"yahoo-{league_id}-(.*)\\.db", db_filename)
             if match:
                 league_name = match.group(1)
-            timestamp = os.path.getmtime(db_path)
+            timestamp = os.stat(os.path.join(DATA_DIR, db_filename)).st_mtime
+        except FileNotFoundError:
+            # Renamed or removed since it was found; report it as missing.
+            db_exists = False
+            league_name = "[Unknown]"
         except Exception as e:
             logging.error(f"Could not parse DB file info: {e}")
             return jsonify({'db_exists': False, 'error': 'Could not read database file details.', 'is_test_db': False})
@@ -3215,53 +4144,65 @@ def db_status():
 def db_action():
     # --- FIX 1: Check for 'yahoo_token' (from /callback) not 'oauth_token' ---
     if not session.get('yahoo_token'):
-        return jsonify({'error': 'Not authenticated'}), 401
+        return json_body_response(NOT_AUTHENTICATED_BODY, 401)
 
     league_id = session.get('league_id')
     if not league_id:
         return jsonify({'error': 'No league selected'}), 400
 
-    global db_build_status
+    # Read the options before claiming the build lock: a bad body must not leave
+    # the league marked as building with the lock held and no thread to free it.
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid build options.'}), 400
+    options = {
+        'capture_lineups': data.get('capture_lineups', False),
+        'skip_static': data.get('skip_static', False), # From your HTML
+        'skip_players': data.get('skip_players', False) # From your HTML
+    }
+
     with db_build_status_lock:
-        if db_build_status["running"]:
+        league_build_status = db_build_status.get(league_id)
+        if league_build_status and league_build_status["running"]:
             # --- MODIFICATION: Return the active build_id to allow other sessions to listen ---
             return jsonify({
                 'error': 'A build is already in progress.',
-                'build_id': db_build_status.get("current_build_id") # Send the active ID
+                'build_id': league_build_status.get("current_build_id") # Send the active ID
             }), 409
             # --- END MODIFICATION ---
 
         # --- Create session-specific build items ---
         build_id = str(uuid.uuid4())
+        claimed, build_lock = _claim_build_lock(league_id, build_id)
+        if not claimed:
+            return jsonify({
+                'error': 'A build is already in progress.',
+                'build_id': build_lock # The other worker's build id
+            }), 409
         # --- MODIFICATION: Use ephemeral temp directory ---
-        log_file_path = os.path.join(tempfile.gettempdir(), f"{build_id}.log")
+        log_file_path = os.path.join(BUILD_LOG_DIR, f"{build_id}.log")
         # --- END MODIFICATION ---
+        for finished_id in [b for b, event in BUILD_DONE_EVENTS.items() if event.is_set()]:
+            del BUILD_DONE_EVENTS[finished_id]
+        BUILD_DONE_EVENTS[build_id] = threading.Event()
 
         # --- MODIFICATION: Store the new build_id in the global status ---
-        db_build_status = {"running": True, "error": None, "current_build_id": build_id}
+        db_build_status[league_id] = {"running": True, "error": None, "current_build_id": build_id}
         # --- END MODIFICATION ---
 
-    data = request.get_json()
-    options = {
-        'capture_lineups': data.get('capture_lineups', False),
-        'skip_static': data.get('skip_static', False), # From your HTML
-        'skip_players': data.get('skip_players', False) # From your HTML
-    }
-
     # --- FIX 2: Get all session data *before* starting the thread ---
     thread_data = {
         "league_id": league_id,
         "token": session.get('yahoo_token'),
-        "consumer_key": session.get('consumer_key'),
-        "consumer_secret": session.get('consumer_secret'),
-        "dev_mode": session.get('dev_mode', False)
+        "consumer_key": YAHOO_CONSUMER_KEY,
+        "consumer_secret": YAHOO_CONSUMER_SECRET,
+        "dev_mode": session.get('dev_mode', False),
+        "build_lock": build_lock
     }
     # --- End FIX 2 ---
 
     # --- MODIFICATION: Use file-based logging, not Queues ---
     def run_task(build_id, log_file_path, options, data):
-        global db_build_status  # <-- Your existing global fix
-
         # --- Create a temporary logger FOR THIS THREAD ONLY ---
         logger = logging.getLogger(f"db_build_{build_id}")
         logger.setLevel(logging.INFO)
@@ -3285,7 +4226,8 @@ def db_action():
             # ... (rest of your exception handling) ...
             logging.error(f"Failed to create FileHandler for build {build_id}: {e}")
             with db_build_status_lock:
-                db_build_status = {"running": False, "error": str(e), "current_build_id": None}
+                db_build_status[data['league_id']] = {"running": False, "error": str(e), "current_build_id": None}
+            _release_build_lock(data['build_lock'])
             return
         # --- END NEW LOGGER SETUP ---
 
@@ -3310,54 +4252,29 @@ def db_action():
                     'token_time': data['token'].get('expires_at', time.time() + 3600),
                     'guid': data['token'].get('xoauth_yahoo_guid')
                 }
+                from yfpy.query import YahooFantasySportsQuery
                 yq = YahooFantasySportsQuery(
                     data['league_id'],
                     game_code="nhl",
-                    yahoo_access_token_json=auth_data
+                    yahoo_access_token_json=auth_data,
+                    env_var_fallback=False
                 )
+                _use_shared_yahoo_pool(yq.oauth)
+                _pin_league_key(yq, data['league_id'])
 
                 # --- [START NEW LOGS] ---
                 logger.info("yfpy authentication successful.")
-                logger.info("Authenticating with Yahoo API (yfa)...")
                 # --- [END NEW LOGS] ---
 
-                # 3b. Create yfa (lg) instance
-                # ... (creds dict setup) ...
-                creds = {
-                    "consumer_key": data['consumer_key'],
-                    "consumer_secret": data['consumer_secret'],
-                    "access_token": data['token'].get('access_token'),
-                    "refresh_token": data['token'].get('refresh_token'),
-                    "token_type": data['token'].get('token_type', 'bearer'),
-                    "token_time": data['token'].get('expires_at', time.time() + 3600),
-                    "xoauth_yahoo_guid": data['token'].get('xoauth_yahoo_guid')
-                }
-                # ... (temp file setup) ...
-                temp_dir = os.path.join(tempfile.gettempdir(), 'temp_creds')
-                os.makedirs(temp_dir, exist_ok=True)
-                temp_file_path = os.path.join(temp_dir, f"thread_{build_id}.json")
-
-                with open(temp_file_path, 'w') as f:
-                    json.dump(creds, f)
-
-                sc = OAuth2(None, None, from_file=temp_file_path)
-                if not sc.token_is_valid():
-                    # --- [START NEW LOGS] ---
-                    # This is the most likely culprit for the long delay!
-                    logger.info("Thread token expired, refreshing... (This may take a moment)")
-                    # --- [END NEW LOGS] ---
-                    sc.refresh_access_token()
-
-                gm = yfa.Game(sc, 'nhl')
-                lg = gm.to_league(f"nhl.l.{data['league_id']}")
+                # 3b. Create yfa (lg) instance on the same OAuth2 client.
+                # yfpy has already validated (and if needed refreshed) the token, so
+                # there's no second creds file to write or second refresh to wait on.
+                lg = _yfa_league(yq.oauth, data['league_id'])
 
                 # --- [START NEW LOGS] ---
-                logger.info("yfa authentication successful.")
+                logger.info("yfa league handle ready (sharing yfpy's OAuth session).")
                 # --- [END NEW LOGS] ---
 
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-
             else:
                 logger.info("Dev mode: Skipping real API object creation in thread.")
                 yq = None
@@ -3390,21 +4307,26 @@ def db_action():
                 error_msg = result.get('error', 'Unknown error')
                 logger.error(f"--- ERROR: {error_msg} ---")
                 with db_build_status_lock:
-                    db_build_status["error"] = error_msg
+                    db_build_status[data['league_id']]["error"] = error_msg
 
         except Exception as e:
             error_str = f"--- FATAL ERROR: {str(e)} ---"
             logger.error(error_str, exc_info=True)
             with db_build_status_lock:
-                db_build_status["error"] = str(e)
+                db_build_status[data['league_id']]["error"] = str(e)
         finally:
+            # The build may have replaced or renamed the DB file.
+            _invalidate_league_db_pool(data['league_id'])
+            _invalidate_league_page_data(data['league_id'])
             with db_build_status_lock:
                 # --- MODIFICATION: Reset the whole status object ---
-                error_msg = db_build_status.get("error") # Preserve error if one was set
-                db_build_status["running"] = False
-                db_build_status["error"] = error_msg
-                db_build_status["current_build_id"] = None
+                league_build_status = db_build_status[data['league_id']]
+                error_msg = league_build_status.get("error") # Preserve error if one was set
+                league_build_status["running"] = False
+                league_build_status["error"] = error_msg
+                league_build_status["current_build_id"] = None
                 # --- END MODIFICATION ---
+            _release_build_lock(data['build_lock'])
 
             try:
                 # --- MODIFICATION: Create a .done file as a sentinel ---
@@ -3413,6 +4335,8 @@ def db_action():
                 # --- END MODIFICATION ---
             except Exception as e:
                 logger.error(f"Build task {build_id} couldn't create .done file: {e}")
+            with db_build_status_lock:
+                BUILD_DONE_EVENTS[build_id].set()
 
             # --- MODIFICATION: Close the file handler ---
             if file_handler:
@@ -3423,7 +4347,17 @@ def db_action():
             logger.info(f"Build task {build_id} thread finished.")
 
     # --- Start thread with new thread_data arg ---
-    threading.Thread(target=run_task, args=(build_id, log_file_path, options, thread_data)).start()
+    try:
+        _invalidate_league_db_pool(league_id)
+        _invalidate_league_page_data(league_id)
+        threading.Thread(target=run_task, args=(build_id, log_file_path, options, thread_data)).start()
+    except Exception:
+        # No thread will run to release the build, so undo the claim here.
+        with db_build_status_lock:
+            db_build_status[league_id] = {"running": False, "error": None, "current_build_id": None}
+            BUILD_DONE_EVENTS[build_id].set()
+        _release_build_lock(build_lock)
+        raise
 
     return jsonify({'success': True, 'build_id': build_id})
 # --- END MODIFIED ROUTE ---
@@ -3436,7 +4370,7 @@ def db_log_stream():
         return Response("data: ERROR: No build_id provided.\n\ndata: __DONE__\n\n", mimetype='text/event-stream')
 
     # --- MODIFICATION: Check for log files in temp dir ---
-    log_file_path = os.path.join(tempfile.gettempdir(), f"{build_id}.log")
+    log_file_path = os.path.join(BUILD_LOG_DIR, f"{build_id}.log")
     done_file_path = f"{log_file_path}.done"
 
     if not os.path.exists(log_file_path):
@@ -3448,6 +4382,9 @@ def db_log_stream():
             return Response(f"data: ERROR: Invalid build ID {build_id}. It may be complete or never existed.\n\ndata: __DONE__\n\n", mimetype='text/event-stream')
     # --- END MODIFICATION ---
 
+    with db_build_status_lock:
+        done_event = BUILD_DONE_EVENTS.get(build_id)
+
     def generate():
         # --- MODIFICATION: This entire function tails the log file ---
         try:
@@ -3456,10 +4393,13 @@ def db_log_stream():
                     line = f.readline()
                     if line:
                         yield f"data: {line.strip()}\n\n"
-                    elif os.path.exists(done_file_path):
-                        # Done file exists, send final sentinel and break
+                    elif done_event.is_set() if done_event else os.path.exists(done_file_path):
+                        # Build finished, send final sentinel and break
                         yield 'data: __DONE__\n\n'
                         break
+                    elif done_event:
+                        # No new line, but not done. Wait for more output or completion.
+                        done_event.wait(0.5)
                     else:
                         # No new line, but not done. Wait and try again.
                         time.sleep(0.5)
@@ -3483,10 +4423,15 @@ def db_log_stream():
 
     return Response(generate(), mimetype='text/event-stream')
 
-@app.route('/static/<path:filename>')
-def serve_static(filename):
-    return send_from_directory('static', filename)
-
 if __name__ == '__main__':
+    # Local development only; production runs under gunicorn's gevent worker (see render.yaml).
+    # By default this serves through gevent's WSGI server so local runs get the same
+    # cooperative concurrency as production; set FLASK_DEBUG=1 for Werkzeug's
+    # debugger and reloader instead.
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
-    app.run(debug=True, port=5001)
+    if os.environ.get('FLASK_DEBUG') == '1':
+        app.run(debug=True, port=5001, threaded=True)
+    else:
+        from gevent.pywsgi import WSGIServer
+        logging.info("Serving on http://127.0.0.1:5001 (gevent)")
+        WSGIServer(('127.0.0.1', 5001), app).serve_forever()
@@ -10,17 +10,75 @@ import os
 import sqlite3
 import re
 import logging
+import threading
 import time
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta, datetime
+from pathlib import Path
+
+from requests import RequestException
 try:
     from zoneinfo import ZoneInfo
 except ImportError:
     import pytz
-    print("WARNING: zoneinfo not found. Falling back to pytz. Please `pip install pytz` if needed.")
+    logging.getLogger(__name__).warning("zoneinfo not found. Falling back to pytz. Please `pip install pytz` if needed.")
 import ast
 
 
+# --- Precompiled patterns (shared across builds and threads) ---
+# Characters that aren't allowed in the league DB filename.
+_SANITIZE_RE = re.compile(r'[\\/*?:"<>|]')
+# Raw player strings stored in daily_lineups_dump, and the lineup slot prefix (c1 -> c).
+_PLAYER_STRING_RE = re.compile(r"ID: (\d+), Name: .*, Stats: (\[.*\])")
+_LINEUP_POS_RE = re.compile(r"([a-zA-Z]+)")
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]')
+# One "(stat_id, value)" pair inside a player string's Stats list. Only plain
+# numeric literals match; anything else (quoted strings, exponents) is left to
+# ast.literal_eval, so float() never gets to accept "nan" or "inf".
+_STAT_PAIR_RE = re.compile(r"\((-?\d+), (-?\d+(?:\.\d+)?)\)")
+
+# Upper bound on concurrent Yahoo API requests during a build. The calls are
+# network-bound, but Yahoo blocks apps that burst too hard (HTTP 999).
+_YAHOO_FETCH_WORKERS = 4
+
+# SQLite tuning for the league DB. page_size only takes effect on a brand new
+# file (before the first table exists); mmap_size lets the finalizer's large
+# read-back queries avoid copying pages through read() calls.
+_SQLITE_PAGE_SIZE = 8192
+_SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+# The finalizer rebuilds whole tables and their indexes (CREATE TABLE AS,
+# CREATE INDEX); a bigger page cache and in-memory temp storage keep those
+# sorts and rewrites off the disk. The cache only grows as pages are touched.
+_SQLITE_CACHE_SIZE_KIB = 64 * 1024
+# The web app reads league DBs while a refresh writes them. In WAL mode those
+# readers never wait on the writer's commits; NORMAL sync is durable enough for
+# a file the next build regenerates anyway. A WAL DB carries these sidecars.
+_SQLITE_SIDECAR_SUFFIXES = ("-wal", "-shm")
+
+
+def _configure_league_db(con):
+    """Applies the shared pragmas to a league DB writer connection."""
+    con.execute(f"PRAGMA mmap_size={_SQLITE_MMAP_SIZE}")
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute(f"PRAGMA cache_size=-{_SQLITE_CACHE_SIZE_KIB}")
+
+
+def _sqlite_uri(path):
+    """file: URI for path; Path.as_uri escapes '?', '#' and '%' in league names."""
+    return Path(os.path.abspath(path)).as_uri()
+
+
+def _read_only_uri(path):
+    """URI for ATTACHing one of the shared server DBs without write access."""
+    # A build only copies out of these, so nothing it does can lock or journal
+    # files that other leagues' builds are attaching at the same time. ATTACH
+    # only parses URIs on a connection opened with uri=True (see DBFinalizer).
+    return f"{_sqlite_uri(path)}?mode=ro"
+
+
 # --- DB Finalizer Class (from finalize_db.py) ---
 class DBFinalizer:
     """
@@ -38,12 +96,35 @@ class DBFinalizer:
             # --- MODIFIED ---
             self.logger.error(f"Database not found at {self.db_path}. Please provide a valid database file.")
             return None
-        return sqlite3.connect(self.db_path)
+        # uri=True so the read-only ATTACH URIs below are honoured on SQLite
+        # builds without SQLITE_USE_URI instead of creating a file named "file:...".
+        con = sqlite3.connect(_sqlite_uri(self.db_path), uri=True)
+        _configure_league_db(con)
+        return con
+
+    def checkpoint(self):
+        """
+        Folds the WAL back into the main DB file so it is complete on its own.
+        A reader holding an old snapshot can block that; retry briefly, then
+        leave the -wal file for SQLite to fold in later and say so.
+        """
+        if not self.con:
+            return
+        for attempt in range(3):
+            busy, log_frames, checkpointed = self.con.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            if not busy:
+                return
+            time.sleep(0.2 * (attempt + 1))
+        self.logger.warning(
+            f"WAL checkpoint was blocked by readers ({checkpointed} of {log_frames} frames copied); "
+            "the -wal file stays alongside the database until a later checkpoint."
+        )
 
     def close_connection(self):
         """Closes the database connection if it's open."""
         if self.con:
             self.con.close()
+            self.con = None
             # --- MODIFIED ---
             self.logger.info("Finalizer database connection closed.")
 
@@ -70,7 +151,7 @@ class DBFinalizer:
         try:
             # --- MODIFIED ---
             self.logger.info("Attaching player IDs database...")
-            self.con.execute(f"ATTACH DATABASE '{absolute_player_ids_path}' AS player_ids_db")
+            self.con.execute(f"ATTACH DATABASE '{_read_only_uri(absolute_player_ids_path)}' AS player_ids_db")
             attached_successfully = True
             cursor = self.con.cursor()
 
@@ -78,6 +159,7 @@ class DBFinalizer:
             self.logger.info("Importing 'players' table from player_ids_db...")
             cursor.execute("DROP TABLE IF EXISTS main.players")
             cursor.execute("CREATE TABLE main.players AS SELECT * FROM player_ids_db.players")
+            cursor.execute("CREATE INDEX IF NOT EXISTS main.idx_players_player_id ON players(player_id)")
 
             self.con.commit()
             # --- MODIFIED ---
@@ -117,8 +199,8 @@ class DBFinalizer:
         attached_successfully = False
         try:
             # --- MODIFIED ---
-            self.logger.info(f"Attaching projections database...")
-            self.con.execute(f"ATTACH DATABASE '{absolute_proj_path}' AS projections")
+            self.logger.info("Attaching projections database...")
+            self.con.execute(f"ATTACH DATABASE '{_read_only_uri(absolute_proj_path)}' AS projections")
             attached_successfully = True
             cursor = self.con.cursor()
 
@@ -127,9 +209,10 @@ class DBFinalizer:
             tables_to_import = ['off_days', 'schedule', 'team_schedules', 'team_standings']
             for table in tables_to_import:
                 # --- MODIFIED ---
-                self.logger.info(f"Importing table: {table}")
+                self.logger.info("Importing table: %s", table)
                 cursor.execute(f"DROP TABLE IF EXISTS main.{table}")
                 cursor.execute(f"CREATE TABLE main.{table} AS SELECT * FROM projections.{table}")
+            cursor.execute("CREATE INDEX IF NOT EXISTS main.idx_team_schedules_tricode ON team_schedules(team_tricode)")
 
             # --- MODIFIED ---
             self.logger.info("Joining player data with projections...")
@@ -157,6 +240,8 @@ class DBFinalizer:
                 LEFT JOIN main.rostered_players AS r
                 ON p.player_id = r.player_id;
             """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS main.idx_joined_player_id ON joined_player_stats(player_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS main.idx_joined_name_normalized ON joined_player_stats(player_name_normalized)")
 
             self.con.commit()
             # --- MODIFIED ---
@@ -207,6 +292,7 @@ class DBFinalizer:
                 PRIMARY KEY (date_, player_id, stat_id)
             );
         """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_player_stats_team_date ON daily_player_stats(team_id, date_)")
         self.con.commit() # Commit table creation if it happened
 
         # --- OPTIMIZATION START / MODIFICATION ---
@@ -267,79 +353,80 @@ class DBFinalizer:
         self.logger.info(f"Loaded {len(player_norm_name_map)} players for name normalization lookup.")
 
 
-        stats_to_insert = []
-        player_string_pattern = re.compile(r"ID: (\d+), Name: .*, Stats: (\[.*\])")
-        pos_pattern = re.compile(r"([a-zA-Z]+)")
         active_roster_columns = ['c1', 'c2', 'l1', 'l2', 'r1', 'r2', 'd1', 'd2', 'd3', 'd4', 'g1', 'g2']
 
-        for row in all_lineups:
-            # --- Ensure row_dict is created correctly ---
-            try:
-                row_dict = dict(zip(column_names, row))
-                # Now safely access keys
-                date_ = row_dict['date_']
-                team_id = row_dict['team_id']
-            except KeyError as e:
-                # --- MODIFIED ---
-                self.logger.error(f"Missing key {e} when creating row_dict. Column names: {column_names}. Row data: {row}")
-                continue # Skip this row if it doesn't match columns
-            except Exception as e:
-                # --- MODIFIED ---
-                self.logger.error(f"Error processing row {row} with columns {column_names}: {e}")
-                continue # Skip this row on other errors
-            # --- End safety check ---
-
-
-            for col in active_roster_columns:
-                if col in row_dict and row_dict[col]:
-                    player_string = row_dict[col]
-                    match = player_string_pattern.match(player_string)
-                    if match:
-                        player_id = int(match.group(1))
-                        stats_list_str = match.group(2)
-                        pos_match = pos_pattern.match(col)
-                        lineup_pos = pos_match.group(1) if pos_match else None
-                        player_name_normalized = player_norm_name_map.get(str(player_id))
-
-                        try:
-                            stats_list = ast.literal_eval(stats_list_str)
-                            player_stats = dict(stats_list)
-
-                            if (lineup_pos == 'g' and
-                                22 in player_stats and 23 in player_stats):
-                                val_22_ga = player_stats[22]
-                                val_23_gaa = player_stats[23]
-                                if val_23_gaa > 0:
-                                    val_28_toi = (val_22_ga / val_23_gaa) * 60
-                                    player_stats[28] = round(val_28_toi, 2)
-
-
-                            for stat_id, stat_value in player_stats.items():
-                                category = stat_map.get(stat_id, 'UNKNOWN')
-                                stats_to_insert.append((
-                                    date_, team_id, player_id, player_name_normalized,
-                                    lineup_pos, stat_id, category, stat_value
-                                ))
-                        except (ValueError, SyntaxError) as e:
-                            # --- MODIFIED ---
-                            self.logger.warning(f"Could not parse stats for player {player_id} on {date_} in daily_player_stats: {e}")
-
-        if stats_to_insert:
-            # --- MODIFIED ---
-            self.logger.info(f"Found {len(stats_to_insert)} individual stat entries to insert/replace into daily_player_stats.")
-            # --- MODIFICATION: Use INSERT OR REPLACE ---
-            cursor.executemany("""
-                INSERT OR REPLACE INTO daily_player_stats (
-                    date_, team_id, player_id, player_name_normalized, lineup_pos,
-                    stat_id, category, stat_value
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, stats_to_insert)
+        # The lineup position only depends on the column, so resolve it once
+        # here instead of re-running the regex for every player in every row.
+        roster_slots = []
+        for col in active_roster_columns:
+            pos_match = _LINEUP_POS_RE.match(col)
+            roster_slots.append((col, pos_match.group(1) if pos_match else None))
+
+        # Rows are generated lazily so executemany streams them straight into
+        # SQLite instead of materializing every stat tuple in memory first.
+        def iter_stat_rows():
+            for row in all_lineups:
+                # --- Ensure row_dict is created correctly ---
+                try:
+                    row_dict = dict(zip(column_names, row))
+                    # Now safely access keys
+                    date_ = row_dict['date_']
+                    team_id = row_dict['team_id']
+                except KeyError as e:
+                    # --- MODIFIED ---
+                    self.logger.error(f"Missing key {e} when creating row_dict. Column names: {column_names}. Row data: {row}")
+                    continue # Skip this row if it doesn't match columns
+                except Exception as e:
+                    # --- MODIFIED ---
+                    self.logger.error(f"Error processing row {row} with columns {column_names}: {e}")
+                    continue # Skip this row on other errors
+                # --- End safety check ---
+
+
+                for col, lineup_pos in roster_slots:
+                    if col in row_dict and row_dict[col]:
+                        player_string = row_dict[col]
+                        match = _PLAYER_STRING_RE.match(player_string)
+                        if match:
+                            player_id = int(match.group(1))
+                            stats_list_str = match.group(2)
+                            player_name_normalized = player_norm_name_map.get(str(player_id))
+
+                            try:
+                                player_stats = _parse_stats_list(stats_list_str)
+
+                                if (lineup_pos == 'g' and
+                                    22 in player_stats and 23 in player_stats):
+                                    val_22_ga = player_stats[22]
+                                    val_23_gaa = player_stats[23]
+                                    if val_23_gaa > 0:
+                                        val_28_toi = (val_22_ga / val_23_gaa) * 60
+                                        player_stats[28] = round(val_28_toi, 2)
+
+
+                                for stat_id, stat_value in player_stats.items():
+                                    category = stat_map.get(stat_id, 'UNKNOWN')
+                                    yield (
+                                        date_, team_id, player_id, player_name_normalized,
+                                        lineup_pos, stat_id, category, stat_value
+                                    )
+                            except (ValueError, SyntaxError) as e:
+                                # --- MODIFIED ---
+                                self.logger.warning("Could not parse stats for player %s on %s in daily_player_stats: %s", player_id, date_, e)
+
+        # --- MODIFICATION: Use INSERT OR REPLACE ---
+        cursor.executemany("""
+            INSERT OR REPLACE INTO daily_player_stats (
+                date_, team_id, player_id, player_name_normalized, lineup_pos,
+                stat_id, category, stat_value
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, iter_stat_rows())
+
+        if cursor.rowcount > 0:
             self.con.commit()
-            # --- MODIFIED ---
-            self.logger.info("Successfully stored/replaced parsed player stats in daily_player_stats.")
+            self.logger.info(f"Successfully stored/replaced {cursor.rowcount} parsed player stat entries in daily_player_stats.")
         else:
-            # --- MODIFIED ---
             self.logger.info("No new player stats to insert into daily_player_stats.")
 
 
@@ -377,6 +464,7 @@ class DBFinalizer:
                 PRIMARY KEY (date_, player_id, stat_id)
             );
         """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_bench_stats_team_date ON daily_bench_stats(team_id, date_)")
         self.con.commit() # Commit table creation if it happened
 
         # --- OPTIMIZATION START / MODIFICATION ---
@@ -436,83 +524,95 @@ class DBFinalizer:
         self.logger.info(f"Loaded {len(player_norm_name_map)} players for name normalization lookup.")
 
 
-        stats_to_insert = []
-        player_string_pattern = re.compile(r"ID: (\d+), Name: .*, Stats: (\[.*\])")
-        pos_pattern = re.compile(r"([a-zA-Z]+)")
         bench_roster_columns = ['b1', 'b2', 'b3', 'b4', 'b5', 'b6', 'b7', 'b8', 'b9',
                                 'b10', 'b11', 'b12', 'b13', 'b14', 'b15', 'b16', 'b17', 'b18', 'b19',
                                 'i1', 'i2', 'i3', 'i4', 'i5']
 
-        for row in all_lineups:
-            # --- Ensure row_dict is created correctly ---
-            try:
-                row_dict = dict(zip(column_names, row))
-                # Now safely access keys
-                date_ = row_dict['date_']
-                team_id = row_dict['team_id']
-            except KeyError as e:
-                # --- MODIFIED ---
-                self.logger.error(f"Missing key {e} when creating row_dict for bench stats. Column names: {column_names}. Row data: {row}")
-                continue # Skip this row
-            except Exception as e:
-                # --- MODIFIED ---
-                self.logger.error(f"Error processing row {row} for bench stats with columns {column_names}: {e}")
-                continue # Skip this row
-            # --- End safety check ---
-
-
-            for col in bench_roster_columns:
-                if col in row_dict and row_dict[col]:
-                    player_string = row_dict[col]
-                    match = player_string_pattern.match(player_string)
-                    if match:
-                        player_id = int(match.group(1))
-                        stats_list_str = match.group(2)
-                        pos_match = pos_pattern.match(col)
-                        lineup_pos = pos_match.group(1) if pos_match else None
-                        player_name_normalized = player_norm_name_map.get(str(player_id))
-
-                        try:
-                            stats_list = ast.literal_eval(stats_list_str)
-                            player_stats = dict(stats_list)
-
-                            if (22 in player_stats and 23 in player_stats):
-                                val_22_ga = player_stats[22]
-                                val_23_gaa = player_stats[23]
-                                if val_23_gaa > 0:
-                                    val_28_toi = (val_22_ga / val_23_gaa) * 60
-                                    player_stats[28] = round(val_28_toi, 2)
-
-
-                            for stat_id, stat_value in player_stats.items():
-                                category = stat_map.get(stat_id, 'UNKNOWN')
-                                stats_to_insert.append((
-                                    date_, team_id, player_id, player_name_normalized,
-                                    lineup_pos, stat_id, category, stat_value
-                                ))
-                        except (ValueError, SyntaxError) as e:
-                            # --- MODIFIED ---
-                                self.logger.warning(f"Could not parse stats for player {player_id} on {date_} in daily_bench_stats: {e}")
-
-
-        if stats_to_insert:
-            # --- MODIFIED ---
-            self.logger.info(f"Found {len(stats_to_insert)} individual bench stat entries to insert/replace into daily_bench_stats.")
-            # --- MODIFICATION: Use INSERT OR REPLACE ---
-            cursor.executemany("""
-                INSERT OR REPLACE INTO daily_bench_stats (
-                    date_, team_id, player_id, player_name_normalized, lineup_pos,
-                    stat_id, category, stat_value
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, stats_to_insert)
+        # Column -> lineup position, resolved once (see parse_and_store_player_stats).
+        roster_slots = []
+        for col in bench_roster_columns:
+            pos_match = _LINEUP_POS_RE.match(col)
+            roster_slots.append((col, pos_match.group(1) if pos_match else None))
+
+        # Rows are generated lazily so executemany streams them straight into
+        # SQLite instead of materializing every stat tuple in memory first.
+        def iter_stat_rows():
+            for row in all_lineups:
+                # --- Ensure row_dict is created correctly ---
+                try:
+                    row_dict = dict(zip(column_names, row))
+                    # Now safely access keys
+                    date_ = row_dict['date_']
+                    team_id = row_dict['team_id']
+                except KeyError as e:
+                    # --- MODIFIED ---
+                    self.logger.error(f"Missing key {e} when creating row_dict for bench stats. Column names: {column_names}. Row data: {row}")
+                    continue # Skip this row
+                except Exception as e:
+                    # --- MODIFIED ---
+                    self.logger.error(f"Error processing row {row} for bench stats with columns {column_names}: {e}")
+                    continue # Skip this row
+                # --- End safety check ---
+
+
+                for col, lineup_pos in roster_slots:
+                    if col in row_dict and row_dict[col]:
+                        player_string = row_dict[col]
+                        match = _PLAYER_STRING_RE.match(player_string)
+                        if match:
+                            player_id = int(match.group(1))
+                            stats_list_str = match.group(2)
+                            player_name_normalized = player_norm_name_map.get(str(player_id))
+
+                            try:
+                                player_stats = _parse_stats_list(stats_list_str)
+
+                                if (22 in player_stats and 23 in player_stats):
+                                    val_22_ga = player_stats[22]
+                                    val_23_gaa = player_stats[23]
+                                    if val_23_gaa > 0:
+                                        val_28_toi = (val_22_ga / val_23_gaa) * 60
+                                        player_stats[28] = round(val_28_toi, 2)
+
+
+                                for stat_id, stat_value in player_stats.items():
+                                    category = stat_map.get(stat_id, 'UNKNOWN')
+                                    yield (
+                                        date_, team_id, player_id, player_name_normalized,
+                                        lineup_pos, stat_id, category, stat_value
+                                    )
+                            except (ValueError, SyntaxError) as e:
+                                # --- MODIFIED ---
+                                    self.logger.warning("Could not parse stats for player %s on %s in daily_bench_stats: %s", player_id, date_, e)
+
+        # --- MODIFICATION: Use INSERT OR REPLACE ---
+        cursor.executemany("""
+            INSERT OR REPLACE INTO daily_bench_stats (
+                date_, team_id, player_id, player_name_normalized, lineup_pos,
+                stat_id, category, stat_value
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, iter_stat_rows())
+
+        if cursor.rowcount > 0:
             self.con.commit()
-            # --- MODIFIED ---
-            self.logger.info("Successfully stored/replaced parsed bench player stats in daily_bench_stats.")
+            self.logger.info(f"Successfully stored/replaced {cursor.rowcount} parsed bench stat entries in daily_bench_stats.")
         else:
-            # --- MODIFIED ---
             self.logger.info("No new bench player stats to insert into daily_bench_stats.")
 
+
+def _parse_stats_list(stats_list_str):
+    """
+    Parses a player string's "[(stat_id, value), ...]" text into a dict.
+    A single regex pass replaces ast.literal_eval compiling an AST per player;
+    text the pattern doesn't fully cover still goes through literal_eval.
+    """
+    pairs = _STAT_PAIR_RE.findall(stats_list_str)
+    if len(pairs) == stats_list_str.count('('):
+        return {int(stat_id): float(value) if '.' in value else int(value) for stat_id, value in pairs}
+    return dict(ast.literal_eval(stats_list_str))
+
+
 # --- MODIFIED: Accept logger ---
 def _create_tables(cursor, logger):
     """
@@ -580,8 +680,9 @@ def _create_tables(cursor, logger):
         CREATE TABLE IF NOT EXISTS matchups (
             week INTEGER NOT NULL,
             team1 TEXT NOT NULL,
-            team2 TEXT NOT NULL
-        )
+            team2 TEXT NOT NULL,
+            PRIMARY KEY (week, team1, team2)
+        ) WITHOUT ROWID
     ''')
     #rosters
     cursor.execute('''
@@ -617,6 +718,15 @@ def _create_tables(cursor, logger):
             eligible_positions TEXT
         )
     ''')
+    #player_positions (one row per rostered player per eligible slot)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS player_positions (
+            player_id TEXT NOT NULL,
+            position TEXT NOT NULL,
+            PRIMARY KEY (player_id, position)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_player_positions_position ON player_positions(position)")
     #db_metadata
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS db_metadata (
@@ -635,6 +745,21 @@ def _create_tables(cursor, logger):
         )
     ''')
 
+    # --- NEW: Read-path indexes ---
+    # Databases built before matchups had a key accumulated a duplicate row per
+    # week on every update (INSERT OR IGNORE had nothing to conflict on). Clean
+    # those up once and give them a unique index to match the new primary key.
+    cursor.execute("PRAGMA index_list(matchups)")
+    if not any(row[2] for row in cursor.fetchall()):
+        logger.info("Adding unique key to legacy matchups table...")
+        cursor.execute('''
+            DELETE FROM matchups WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM matchups GROUP BY week, team1, team2
+            )
+        ''')
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_matchups_week_teams ON matchups(week, team1, team2)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_move_date ON transactions(move_type, transaction_date)")
+
 # --- MODIFIED: Accept logger ---
 def _update_league_info(yq, cursor, league_id, league_name, league_metadata, logger):
     """
@@ -659,14 +784,16 @@ def _update_league_info(yq, cursor, league_id, league_name, league_metadata, log
 
 
 # --- MODIFIED: Accept logger ---
-def _update_teams_info(yq, cursor, logger):
+def _update_teams_info(yq, cursor, logger, teams=None):
     """
-    Fetches team data and updates the teams table.
+    Fetches team data and updates the teams table. Teams already returned
+    alongside the league metadata are used as-is.
     """
     # --- MODIFIED ---
     logger.info("Updating teams table...")
     try:
-        teams = yq.get_league_teams()
+        if not teams:
+            teams = yq.get_league_teams()
         teams_data_to_insert = []
         for team in teams:
             team_id = team.team_id
@@ -709,6 +836,266 @@ def _get_current_week_start_date(cursor, logger):
         return date.today().isoformat()
 
 
+# --- NEW: League settings memoization ---
+# Scoring categories, roster slots and the playoff week are fixed for a season
+# (short of a commissioner edit), yet every build asked Yahoo for them twice.
+# Keep each league's settings for a while so both updates, and any rebuild
+# soon after, share a single fetch.
+_LEAGUE_SETTINGS_TTL = 900 # seconds
+# Bounded so a long-running process serving many leagues doesn't grow without
+# limit; when full, the least-used league is evicted (LFU).
+_LEAGUE_SETTINGS_CACHE_MAX_ENTRIES = 512
+_LEAGUE_SETTINGS_CACHE = {} # league_key -> [expires_at, settings, hits]
+_LEAGUE_SETTINGS_CACHE_LOCK = threading.Lock()
+
+
+def _get_league_settings(yq):
+    """Returns yq.get_league_settings(), served from the TTL cache when fresh."""
+    cache_key = getattr(yq, 'league_key', None) or yq.league_id
+    now = time.time()
+    with _LEAGUE_SETTINGS_CACHE_LOCK:
+        cached = _LEAGUE_SETTINGS_CACHE.get(cache_key)
+        if cached and cached[0] > now:
+            cached[2] += 1
+            return cached[1]
+    settings = yq.get_league_settings()
+    _cache_league_settings(cache_key, settings)
+    return settings
+
+
+def _cache_league_settings(cache_key, settings):
+    """Stores a league's settings, dropping expired entries and, when full, the least used."""
+    now = time.time()
+    with _LEAGUE_SETTINGS_CACHE_LOCK:
+        for stale_key in [k for k, entry in _LEAGUE_SETTINGS_CACHE.items() if entry[0] <= now]:
+            del _LEAGUE_SETTINGS_CACHE[stale_key]
+        while len(_LEAGUE_SETTINGS_CACHE) >= _LEAGUE_SETTINGS_CACHE_MAX_ENTRIES:
+            del _LEAGUE_SETTINGS_CACHE[min(_LEAGUE_SETTINGS_CACHE, key=lambda k: _LEAGUE_SETTINGS_CACHE[k][2])]
+        _LEAGUE_SETTINGS_CACHE[cache_key] = [now + _LEAGUE_SETTINGS_TTL, settings, 0]
+
+
+def _get_league_overview(yq, logger):
+    """
+    Returns the league's metadata with its settings and teams filled in, from a
+    single league;out=settings,teams request instead of separate metadata,
+    settings and teams round trips. The settings seed the memoized copy above.
+    Falls back to the plain metadata request if the combined one fails.
+    """
+    try:
+        from yfpy.models import League
+        league = yq.query(f"{_YAHOO_API_BASE}/league/{yq.get_league_key()};out=settings,teams", ["league"], League)
+    except Exception as e:
+        logger.warning("Combined league query failed (%r). Fetching metadata on its own.", e)
+        return yq.get_league_metadata()
+
+    if league.league_key and league.settings and league.settings.roster_positions:
+        _cache_league_settings(league.league_key, league.settings)
+    return league
+
+
+# --- NEW: Overlapped yfa player-pool fetches ---
+_FREE_AGENT_POSITIONS = ('C', 'LW', 'RW', 'D', 'G')
+
+
+class _PrefetchedPlayerPools:
+    """
+    Stands in for the yfa League in the free agent, waiver and rostered
+    player updates. Those seven requests don't depend on each other or on
+    anything yfpy fetches, so they're all started when the build begins and
+    overlap with the yfpy phase; the update functions just collect results
+    (and see the same exceptions the direct calls would have raised).
+    """
+
+    def __init__(self, lg, executor):
+        self._free_agents = {pos: executor.submit(lg.free_agents, pos) for pos in _FREE_AGENT_POSITIONS}
+        self._waivers = executor.submit(lg.waivers)
+        self._taken_players = executor.submit(lg.taken_players)
+
+    def free_agents(self, pos):
+        return self._free_agents[pos].result()
+
+    def waivers(self):
+        return self._waivers.result()
+
+    def taken_players(self):
+        return self._taken_players.result()
+
+
+class _PrefetchedLeagueFeeds:
+    """
+    Stands in for yq in the fantasy weeks and transactions updates. Neither
+    request depends on the other or on earlier build steps, so both are started
+    with the player pools instead of waiting their turn behind the settings and
+    matchup fetches.
+    """
+
+    def __init__(self, yq, game_id, executor):
+        self._weeks = executor.submit(yq.get_game_weeks_by_game_id, game_id)
+        self._transactions = executor.submit(yq.get_league_transactions)
+
+    def get_game_weeks_by_game_id(self, game_id):
+        return self._weeks.result()
+
+    def get_league_transactions(self):
+        return self._transactions.result()
+
+
+# --- NEW: Deferred deletion of replaced DB files ---
+# Old league DBs are renamed into data_dir/.trash (a same-filesystem rename is
+# atomic and instant) and unlinked on a background thread, so the build never
+# waits on the delete and readers never see a half-removed file.
+_TRASH_DIRNAME = '.trash'
+
+
+def _purge_trash(trash_dir, logger):
+    """Unlinks everything in the trash dir. Runs on a daemon thread."""
+    try:
+        with os.scandir(trash_dir) as it:
+            for entry in it:
+                try:
+                    os.remove(entry.path)
+                except OSError as e:
+                    logger.warning("Could not remove trashed file %s: %s", entry.path, e)
+    except OSError as e:
+        logger.warning("Could not empty trash dir %s: %s", trash_dir, e)
+
+
+def _move_to_trash(paths, data_dir, logger):
+    """Moves files into data_dir/.trash and schedules their deletion."""
+    if not paths:
+        return
+    trash_dir = os.path.join(data_dir, _TRASH_DIRNAME)
+    os.makedirs(trash_dir, exist_ok=True)
+    stamp = time.time_ns()
+    for path in paths:
+        os.replace(path, os.path.join(trash_dir, f"{os.path.basename(path)}.{stamp}"))
+        logger.info("Moved %s to trash.", os.path.basename(path))
+        for suffix in _SQLITE_SIDECAR_SUFFIXES:
+            if os.path.exists(path + suffix):
+                os.replace(path + suffix, os.path.join(trash_dir, f"{os.path.basename(path)}{suffix}.{stamp}"))
+    threading.Thread(target=_purge_trash, args=(trash_dir, logger), daemon=True).start()
+
+
+# --- NEW: Lightweight roster parsing for the daily lineup fetch ---
+# The lineup dump only keeps four fields per player, but yfpy's
+# get_team_roster_player_info_by_date asks Yahoo for ownership/percent
+# owned/draft analysis too and builds a full model object graph for every
+# player, every team, every day. Read the raw JSON instead.
+_YAHOO_API_BASE = "https://fantasysports.yahooapis.com/fantasy/v2"
+
+# daily_lineups_dump column layout: Yahoo position -> slot prefix, and the slot
+# columns in table order. IR and IR+ share the 'i' slots.
+_LINEUP_SLOT_PREFIX = {"C": "c", "LW": "l", "RW": "r", "D": "d", "G": "g", "BN": "b", "IR": "i", "IR+": "i"}
+_LINEUP_SLOTS = (
+    'c1', 'c2', 'l1', 'l2', 'r1', 'r2', 'd1', 'd2', 'd3', 'd4',
+    'g1', 'g2', 'b1', 'b2', 'b3', 'b4', 'b5', 'b6',
+    'b7', 'b8', 'b9', 'b10', 'b11', 'b12', 'b13', 'b14',
+    'b15', 'b16', 'b17', 'b18', 'b19', 'i1', 'i2', 'i3', 'i4', 'i5'
+)
+_SQL_INSERT_DAILY_LINEUP = (
+    f"INSERT OR REPLACE INTO daily_lineups_dump (date_, team_id, {', '.join(_LINEUP_SLOTS)}) "
+    f"VALUES ({', '.join('?' * (len(_LINEUP_SLOTS) + 2))})"
+)
+
+
+def _merge_yahoo_fragments(fragments):
+    """Yahoo's JSON splits objects into lists of single-key dicts; fold them into one dict."""
+    merged = {}
+    for fragment in fragments:
+        if isinstance(fragment, list):
+            merged.update(_merge_yahoo_fragments(fragment))
+        elif isinstance(fragment, dict):
+            merged.update(fragment)
+    return merged
+
+
+def _yahoo_stat_value(value):
+    """Same coercion yfpy's Stat model applies: numbers become floats, anything else ('-') is 0.0."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse_roster_players(roster):
+    """
+    Converts a raw roster payload into a list of
+    (player_id, player_name, selected_position, [(stat_id, value), ...]).
+    """
+    players = roster["0"]["players"]
+    lineup = []
+    if isinstance(players, dict):
+        for key, entry in players.items():
+            if key == "count":
+                continue
+            player = _merge_yahoo_fragments(entry["player"])
+            position = _merge_yahoo_fragments(player.get("selected_position", [])).get("position", "")
+            stats_dict = {}
+            for stat_entry in (player.get("player_stats") or {}).get("stats") or []:
+                stat = stat_entry["stat"]
+                stats_dict[int(stat["stat_id"])] = _yahoo_stat_value(stat.get("value"))
+            lineup.append((int(player["player_id"]), player["name"]["full"], position, list(stats_dict.items())))
+    return lineup
+
+
+def _fetch_league_lineups(yq, team_ids, date_str, logger):
+    """
+    Returns {team_id: lineup} for every team on a date from a single multi-key
+    teams request (team_keys=k1,k2,...) rather than one request per team.
+    Any team missing from, or malformed in, the response is fetched on its own,
+    as is every team if the batched request itself fails.
+    """
+    from yfpy.exceptions import YahooFantasySportsException
+
+    league_key = yq.get_league_key()
+    team_keys = ",".join(f"{league_key}.t.{team_id}" for team_id in team_ids)
+    url = f"{_YAHOO_API_BASE}/teams;team_keys={team_keys}/roster;date={date_str}/players;out=stats"
+    lineups = {}
+    try:
+        response = yq.get_response(url)
+    except (RequestException, YahooFantasySportsException) as e:
+        logger.warning("Batched teams roster request for %s failed (%r). Fetching teams individually.", date_str, e)
+    else:
+        try:
+            teams = response.json()["fantasy_content"]["teams"]
+            for key, entry in teams.items():
+                if key == "count":
+                    continue
+                team = _merge_yahoo_fragments(entry["team"])
+                lineups[int(team["team_id"])] = _parse_roster_players(team["roster"])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            logger.warning("Unexpected teams roster payload for %s (%r). Fetching remaining teams individually.", date_str, e)
+
+    for team_id in team_ids:
+        if team_id not in lineups:
+            lineups[team_id] = _fetch_team_lineup(yq, team_id, date_str, logger)
+    return lineups
+
+
+def _fetch_team_lineup(yq, team_id, date_str, logger):
+    """
+    Returns a team's roster on a date as a list of
+    (player_id, player_name, selected_position, [(stat_id, value), ...]).
+    Falls back to yfpy's models if the payload isn't shaped as expected.
+    """
+    team_key = f"{yq.get_league_key()}.t.{team_id}"
+    url = f"{_YAHOO_API_BASE}/team/{team_key}/roster;date={date_str}/players;out=stats"
+    try:
+        content = yq.get_response(url).json()["fantasy_content"]
+        return _parse_roster_players(_merge_yahoo_fragments(content["team"])["roster"])
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Unexpected roster payload for team %s on %s (%r). Falling back to yfpy models.", team_id, date_str, e)
+
+    lineup = []
+    for player in yq.get_team_roster_player_info_by_date(team_id, date_str):
+        player_stats = []
+        if player.player_stats and player.player_stats.stats:
+            stats_dict = {stat_item.stat_id: stat_item.value for stat_item in player.player_stats.stats}
+            player_stats = list(stats_dict.items())
+        lineup.append((player.player_id, player.name.full, player.selected_position.position, player_stats))
+    return lineup
+
+
 # --- MODIFIED: Accept logger ---
 def _update_daily_lineups(yq, cursor, conn, num_teams, league_start_date, is_full_mode, logger):
     """
@@ -775,75 +1162,52 @@ def _update_daily_lineups(yq, cursor, conn, num_teams, league_start_date, is_ful
                 logger.info(f"No existing lineup data. Capture is UNCHECKED, starting from current week start date - 1 day: {start_date_for_fetch}.")
 
 
-        team_id = 1
         # --- MODIFICATION: stop_date is TODAY, so loop runs up to (but not including) today ---
         stop_date = today_iso
         # --- END MODIFICATION ---
-        lineup_data_to_insert = []
 
         if start_date_for_fetch >= stop_date:
             # --- MODIFIED ---
             logger.info(f"Daily lineups are already up to date (Start: {start_date_for_fetch}, Stop: {stop_date}). Nothing to fetch.")
             return
 
-        while team_id <= num_teams:
-            current_date = start_date_for_fetch
-            # --- MODIFICATION: Loop condition will now run up to, but NOT including, today ---
-            while current_date < stop_date:
-                # --- MODIFIED ---
-                logger.info(f"Fetching daily lineups for team {team_id}, for {current_date}...")
-                players = yq.get_team_roster_player_info_by_date(team_id,current_date)
-                c, lw, rw, d, g, bn, ir = 0, 0, 0, 0, 0, 0, 0
-                lineup_data_raw = []
-                for player in players:
-                    player_id = player.player_id
-                    player_name = player.name.full
-                    pos = player.selected_position.position
-                    if pos == "C": pos, c = 'c'+str(c+1), c+1
-                    elif pos == "LW": pos, lw = 'l'+str(lw+1), lw+1
-                    elif pos == "RW": pos, rw = 'r'+str(rw+1), rw+1
-                    elif pos == "D": pos, d = 'd'+str(d+1), d+1
-                    elif pos == "G": pos, g = 'g'+str(g+1), g+1
-                    elif pos == "BN": pos, bn = 'b'+str(bn+1), bn+1
-                    elif pos == "IR" or pos == "IR+": pos, ir = 'i'+str(ir+1), ir+1
-
-                    player_stats = []
-                    if player.player_stats and player.player_stats.stats:
-                        stats_list = player.player_stats.stats
-                        stats_dict = {stat_item.stat_id: stat_item.value for stat_item in stats_list}
-                        for stat_id, stat_value in stats_dict.items():
-                            player_stats.append((stat_id, stat_value))
-
-                    player_data_string = f"ID: {player_id}, Name: {player_name}, Stats: {str(player_stats)}"
-                    lineup_data_raw.append((player_data_string, pos))
-
-                lineup_raw_dict = {position: data_string for data_string, position in lineup_data_raw}
-                lineup_order = [
-                    'c1', 'c2', 'l1', 'l2', 'r1', 'r2', 'd1', 'd2', 'd3', 'd4',
-                    'g1', 'g2', 'b1', 'b2', 'b3', 'b4', 'b5', 'b6',
-                    'b7', 'b8', 'b9', 'b10', 'b11', 'b12', 'b13', 'b14',
-                    'b15', 'b16', 'b17', 'b18', 'b19', 'i1', 'i2', 'i3', 'i4', 'i5'
-                ]
-                lineup_data_values = [lineup_raw_dict.get(pos, None) for pos in lineup_order]
-                full_row = [current_date, team_id] + lineup_data_values
-                lineup_data_to_insert.append(tuple(full_row))
-                current_date = (date.fromisoformat(current_date)+timedelta(1)).isoformat()
-            team_id += 1
+        fetch_dates = []
+        current_date = start_date_for_fetch
+        while current_date < stop_date:
+            fetch_dates.append(current_date)
+            current_date = (date.fromisoformat(current_date)+timedelta(1)).isoformat()
+
+        team_ids = list(range(1, num_teams + 1))
+
+        def fetch_lineup_rows(current_date):
+            # --- MODIFIED ---
+            logger.info("Fetching daily lineups for all teams, for %s...", current_date)
+            rows = []
+            for team_id, players in _fetch_league_lineups(yq, team_ids, current_date, logger).items():
+                slot_counts = {}
+                lineup_raw_dict = {}
+                for player_id, player_name, pos, player_stats in players:
+                    prefix = _LINEUP_SLOT_PREFIX.get(pos)
+                    if prefix:
+                        slot_counts[prefix] = slot_counts.get(prefix, 0) + 1
+                        pos = f"{prefix}{slot_counts[prefix]}"
+                    lineup_raw_dict[pos] = f"ID: {player_id}, Name: {player_name}, Stats: {player_stats}"
+                rows.append((current_date, team_id, *map(lineup_raw_dict.get, _LINEUP_SLOTS)))
+            return rows
+
+        # One batched roster request per day covers every team; a full-season
+        # capture is still a few hundred of them, so keep a few in flight at once.
+        lineup_data_to_insert = []
+        with ThreadPoolExecutor(max_workers=_YAHOO_FETCH_WORKERS) as executor:
+            for rows in executor.map(fetch_lineup_rows, fetch_dates):
+                lineup_data_to_insert.extend(rows)
 
         if not lineup_data_to_insert:
             # --- MODIFIED ---
             logger.info("No new daily lineups to insert for the specified date range.")
             return
 
-        placeholders = ', '.join(['?'] * 38)
-        sql = f"""
-            INSERT OR REPLACE INTO daily_lineups_dump (
-                date_, team_id, c1, c2, l1, l2, r1, r2, d1, d2, d3, d4, g1, g2,
-                b1, b2, b3, b4, b5, b6, b7, b8, b9, b10, b11, b12, b13, b14, b15,
-                b16, b17, b18, b19, i1, i2, i3, i4, i5
-            ) VALUES ({placeholders})
-        """
-        cursor.executemany(sql, lineup_data_to_insert)
+        cursor.executemany(_SQL_INSERT_DAILY_LINEUP, lineup_data_to_insert)
         # --- MODIFIED ---
         logger.info(f"Successfully inserted or replaced data for {len(lineup_data_to_insert)} dates.")
     except Exception as e:
@@ -868,15 +1232,15 @@ def _update_player_id(yq, cursor, logger):
             player_count += 1
             player_name = player.name.full
             nfkd_form = unicodedata.normalize('NFKD', player_name.lower())
-            ascii_name = "".join([c for c in nfkd_form if not unicodedata.combining(c)])
-            player_name_normalized = re.sub(r'[^a-z0-9]', '', ascii_name)
+            ascii_name = "".join(c for c in nfkd_form if not unicodedata.combining(c))
+            player_name_normalized = _NON_ALNUM_RE.sub('', ascii_name)
             player_team_abbr = player.editorial_team_abbr.upper()
             player_team = TEAM_TRICODE_MAP.get(player_team_abbr, player_team_abbr)
             player_data_to_insert.append((player.player_id, player_name, player_team, player_name_normalized))
 
             if len(player_data_to_insert) >= batch_size:
                 # --- MODIFIED ---
-                logger.info(f"Processed {player_count} players, inserting batch of {len(player_data_to_insert)}...")
+                logger.info("Processed %d players, inserting batch of %d...", player_count, len(player_data_to_insert))
                 cursor.executemany(sql, player_data_to_insert)
                 player_data_to_insert = []
 
@@ -901,7 +1265,7 @@ def _update_league_scoring_settings(yq, cursor, logger):
     # --- MODIFIED ---
     logger.info("Fetching league scoring...")
     try:
-        settings = yq.get_league_settings()
+        settings = _get_league_settings(yq)
         playoff_start_week = settings.playoff_start_week
         scoring_settings_to_insert = []
         for stat_item in settings.stat_categories.stats:
@@ -927,7 +1291,7 @@ def _update_league_scoring_settings(yq, cursor, logger):
 # --- MODIFIED: Accept logger ---
 def _update_lineup_settings(yq, cursor, logger):
     try:
-        settings = yq.get_league_settings()
+        settings = _get_league_settings(yq)
         lineup_settings_data_to_insert = []
         for roster_position_item in settings.roster_positions:
             position_details = roster_position_item
@@ -985,20 +1349,21 @@ def _update_league_matchups(yq, cursor, playoff_start_week, logger):
             return
 
         last_reg_season_week = playoff_start_week-1
-        start_week = 1
+        weeks = range(1, last_reg_season_week + 1)
         matchup_data_to_insert = []
 
-        while start_week <= last_reg_season_week:
-            matchups = yq.get_league_matchups_by_week(start_week)
-            for matchup in matchups:
-                matchups_for_week = []
-                for team_item in matchup.teams:
-                    team_block = team_item
-                    team_name = team_block.name
-                    matchups_for_week.append(team_name)
-                matchups_for_week.insert(0,start_week)
-                matchup_data_to_insert.append(matchups_for_week)
-            start_week += 1
+        # Each week is its own Yahoo request; fetch them concurrently instead of
+        # paying one round trip per week in sequence. map() keeps week order.
+        with ThreadPoolExecutor(max_workers=_YAHOO_FETCH_WORKERS) as executor:
+            for week, matchups in zip(weeks, executor.map(yq.get_league_matchups_by_week, weeks)):
+                for matchup in matchups:
+                    matchups_for_week = []
+                    for team_item in matchup.teams:
+                        team_block = team_item
+                        team_name = team_block.name
+                        matchups_for_week.append(team_name)
+                    matchups_for_week.insert(0,week)
+                    matchup_data_to_insert.append(matchups_for_week)
 
         sql = "INSERT OR IGNORE INTO matchups (week, team1, team2) VALUES (?, ?, ?)"
         cursor.executemany(sql, matchup_data_to_insert)
@@ -1029,16 +1394,19 @@ def _update_current_rosters(yq, cursor, conn, num_teams, logger):
     try:
         roster_data_to_insert = []
         MAX_PLAYERS = 29
+        today_iso = date.today().isoformat()
 
-        for team_id in range(1, num_teams + 1):
-            players = yq.get_team_roster_player_info_by_date(team_id, date.today().isoformat())
-            player_ids = [player.player_id for player in players][:MAX_PLAYERS]
+        # Every team's roster comes back from one batched teams request.
+        team_ids = list(range(1, num_teams + 1))
+        lineups = _fetch_league_lineups(yq, team_ids, today_iso, logger)
+        for team_id in team_ids:
+            player_ids = [player[0] for player in lineups[team_id]][:MAX_PLAYERS]
             padded_player_ids = player_ids + [None] * (MAX_PLAYERS - len(player_ids))
             row_data = [team_id] + padded_player_ids
             roster_data_to_insert.append(row_data)
 
         placeholders = ', '.join(['?'] * (MAX_PLAYERS + 1))
-        cols = ", ".join([f"p{i}" for i in range(1, MAX_PLAYERS + 1)])
+        cols = ", ".join(f"p{i}" for i in range(1, MAX_PLAYERS + 1))
         sql = f"""INSERT INTO rosters (
                     team_id, {cols})
                     VALUES ({placeholders})
@@ -1071,6 +1439,7 @@ def _create_rosters_tall_and_drop_rosters(cursor, conn, logger):
 
         create_tall_table_query = f"CREATE TABLE rosters_tall AS\n{unpivot_query};"
         cursor.execute(create_tall_table_query)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_rosters_tall_team ON rosters_tall(team_id)")
         # --- MODIFIED ---
         logger.info("Successfully created 'rosters_tall' table.")
 
@@ -1121,43 +1490,44 @@ def _update_league_transactions(yq, cursor, logger):
 
     try:
         transactions = yq.get_league_transactions()
-        transaction_data_to_insert = []
-        processed_transactions = set()
 
-        for transaction in transactions:
-            if transaction.status == 'successful':
-                timestamp_epoch = transaction.timestamp
+        def iter_transaction_rows():
+            processed_transactions = set()
+
+            for transaction in transactions:
+                if transaction.status == 'successful':
+                    timestamp_epoch = transaction.timestamp
 
-                # --- TIMEZONE CORRECTION START ---
-                # 1. Create a datetime object from epoch, aware it's in UTC
-                utc_time = datetime.fromtimestamp(timestamp_epoch, tz=UTC_TZ)
+                    # --- TIMEZONE CORRECTION START ---
+                    # 1. Create a datetime object from epoch, aware it's in UTC
+                    utc_time = datetime.fromtimestamp(timestamp_epoch, tz=UTC_TZ)
 
-                # 2. Convert the UTC time to the league's local timezone
-                local_time = utc_time.astimezone(LEAGUE_TZ)
+                    # 2. Convert the UTC time to the league's local timezone
+                    local_time = utc_time.astimezone(LEAGUE_TZ)
 
-                # 3. Extract the date *from the local time*
-                transaction_date = local_time.strftime('%Y-%m-%d')
-                # --- TIMEZONE CORRECTION END ---
+                    # 3. Extract the date *from the local time*
+                    transaction_date = local_time.strftime('%Y-%m-%d')
+                    # --- TIMEZONE CORRECTION END ---
 
-                for player_obj in transaction.players:
-                    player_id = player_obj.player_id
-                    player_name = player_obj.name.full
-                    move_type = player_obj.transaction_data.type
+                    for player_obj in transaction.players:
+                        player_id = player_obj.player_id
+                        player_name = player_obj.name.full
+                        move_type = player_obj.transaction_data.type
 
-                    if move_type == 'add':
-                        fantasy_team = player_obj.transaction_data.destination_team_name
-                    else:
-                        fantasy_team = player_obj.transaction_data.source_team_name
+                        if move_type == 'add':
+                            fantasy_team = player_obj.transaction_data.destination_team_name
+                        else:
+                            fantasy_team = player_obj.transaction_data.source_team_name
 
-                    unique_key = (timestamp_epoch, player_id, move_type)
-                    if unique_key not in processed_transactions:
-                        transaction_data_to_insert.append((transaction_date, player_id, player_name, fantasy_team, move_type))
-                        processed_transactions.add(unique_key)
+                        unique_key = (timestamp_epoch, player_id, move_type)
+                        if unique_key not in processed_transactions:
+                            yield (transaction_date, player_id, player_name, fantasy_team, move_type)
+                            processed_transactions.add(unique_key)
 
         sql = "INSERT INTO transactions (transaction_date, player_id, player_name, fantasy_team, move_type) VALUES (?, ?, ?, ?, ?)"
-        cursor.executemany(sql, transaction_data_to_insert)
+        cursor.executemany(sql, iter_transaction_rows())
         # --- MODIFIED ---
-        logger.info(f"Successfully inserted data for {len(transaction_data_to_insert)} transactions.")
+        logger.info(f"Successfully inserted data for {cursor.rowcount} transactions.")
 
     except Exception as e:
         # --- MODIFIED ---
@@ -1184,10 +1554,10 @@ def _update_free_agents(lg, conn, logger):
         return
 
     free_agents_to_insert = []
-    for pos in ['C', 'LW', 'RW', 'D', 'G']:
+    for pos in _FREE_AGENT_POSITIONS:
         try:
             # --- MODIFIED ---
-            logger.info(f"Fetching free agents for position: {pos}")
+            logger.info("Fetching free agents for position: %s", pos)
             fas = lg.free_agents(pos)
             for player in fas:
                 player_id = player['player_id']
@@ -1225,7 +1595,7 @@ def _update_waivers(lg, conn, logger):
     waiver_players_to_insert = []
     try:
         # --- MODIFIED ---
-        logger.info(f"Fetching all waiver players")
+        logger.info("Fetching all waiver players")
         wvp = lg.waivers()
         for player in wvp:
             player_id = player['player_id']
@@ -1253,6 +1623,7 @@ def _update_rostered_players(lg, conn, logger):
         # --- MODIFIED ---
         logger.info("Clearing existing data from rostered_players table.")
         cursor.execute("DELETE FROM rostered_players")
+        cursor.execute("DELETE FROM player_positions")
         conn.commit()
     except Exception as e:
         # --- MODIFIED ---
@@ -1283,6 +1654,13 @@ def _update_rostered_players(lg, conn, logger):
     try:
         sql = "INSERT OR IGNORE INTO rostered_players (player_id, status, eligible_positions) VALUES (?, ?, ?)"
         cursor.executemany(sql, rostered_players_to_insert)
+        # Same data, one row per position, so "who can play G" is an index
+        # lookup instead of a string split. eligible_positions stays for the
+        # page queries that read it as a single string.
+        cursor.executemany(
+            "INSERT OR IGNORE INTO player_positions (player_id, position) VALUES (?, ?)",
+            ((player['player_id'], pos) for player in tkp for pos in player['eligible_positions'])
+        )
         conn.commit()
         # --- MODIFIED ---
         logger.info(f"Successfully inserted data for {len(rostered_players_to_insert)} rostered players.")
@@ -1327,6 +1705,9 @@ def update_league_db(yq, lg, league_id, data_dir, logger, capture_lineups=False)
     Creates or updates the league-specific SQLite database by calling
     individual query and update functions.
     """
+    prefetch_executor = None
+    conn = None
+    finalizer = None
     try:
         # --- MODIFIED ---
         logger.info(f"Starting DB update for league {league_id}...")
@@ -1336,23 +1717,39 @@ def update_league_db(yq, lg, league_id, data_dir, logger, capture_lineups=False)
             logger.error("Yahoo Query object (yq) is None. Cannot proceed.")
             return {'success': False, 'error': 'yfpy (yq) object not initialized. Check dev mode.'}
 
-        league_metadata = yq.get_league_metadata()
+        league_metadata = _get_league_overview(yq, logger)
+        # yfpy never stores the league key it resolves, so every league/team
+        # query would otherwise re-fetch and parse the current game's metadata
+        # just to rebuild "<game_key>.l.<league_id>". Pin it for this build.
+        if league_metadata.league_key:
+            yq.league_key = league_metadata.league_key
         league_name_str = league_metadata.name
         if isinstance(league_name_str, bytes):
             league_name_str = league_name_str.decode('utf-8', 'ignore')
 
-        sanitized_name = re.sub(r'[\\/*?:"<>|]', "", league_name_str)
+        sanitized_name = _SANITIZE_RE.sub("", league_name_str)
         db_filename = f"yahoo-{league_id}-{sanitized_name}.db"
         db_path = os.path.join(data_dir, db_filename)
 
+        # A renamed league gets a new filename, but the app finds DBs by the
+        # league id prefix alone, so older copies must not be left behind.
+        db_prefix = f"yahoo-{league_id}-"
+        with os.scandir(data_dir) as it:
+            stale_db_paths = [
+                entry.path for entry in it
+                if entry.name.startswith(db_prefix) and entry.name.endswith(".db")
+                and entry.name != db_filename and entry.is_file(follow_symlinks=False)
+            ]
+
         if capture_lineups:
             # --- MODIFIED ---
             logger.info("Full mode selected (capture_lineups=True). Checking for existing database file...")
-            if os.path.exists(db_path):
+            paths_to_trash = stale_db_paths + ([db_path] if os.path.exists(db_path) else [])
+            if paths_to_trash:
                 try:
                     # --- MODIFIED ---
-                    logger.warning(f"Deleting existing database file: {db_path}")
-                    os.remove(db_path)
+                    logger.warning(f"Deleting existing database file(s): {', '.join(paths_to_trash)}")
+                    _move_to_trash(paths_to_trash, data_dir, logger)
                     logger.info("Existing database file deleted successfully.")
                 except OSError as e:
                     # --- MODIFIED ---
@@ -1364,24 +1761,47 @@ def update_league_db(yq, lg, league_id, data_dir, logger, capture_lineups=False)
         else:
             # --- MODIFIED ---
             logger.info("Update mode selected (capture_lineups=False). Existing database file will be updated.")
+            if stale_db_paths:
+                try:
+                    if not os.path.exists(db_path):
+                        # Keep the captured history: carry the newest old DB over to the new name.
+                        stale_db_paths.sort(key=os.path.getmtime)
+                        newest = stale_db_paths.pop()
+                        logger.info(f"League was renamed. Moving {os.path.basename(newest)} to {db_filename}.")
+                        os.replace(newest, db_path)
+                        for suffix in _SQLITE_SIDECAR_SUFFIXES:
+                            if os.path.exists(newest + suffix):
+                                os.replace(newest + suffix, db_path + suffix)
+                    _move_to_trash(stale_db_paths, data_dir, logger)
+                except OSError as e:
+                    logger.error(f"Error cleaning up old database files: {e}", exc_info=True)
 
         # --- MODIFIED ---
         logger.info(f"Connecting to database: {db_path}")
+        is_new_db = not os.path.exists(db_path)
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
+        if is_new_db:
+            cursor.execute(f"PRAGMA page_size={_SQLITE_PAGE_SIZE}")
+        _configure_league_db(conn)
 
         # --- yfpy API Call Functions ---
         # --- MODIFIED: Pass logger to all calls ---
+        prefetch_executor = ThreadPoolExecutor(max_workers=_YAHOO_FETCH_WORKERS)
+        league_feeds = _PrefetchedLeagueFeeds(yq, (league_metadata.league_key or '').split('.', 1)[0], prefetch_executor)
+        if lg is not None:
+            player_pools = _PrefetchedPlayerPools(lg, prefetch_executor)
+
         _create_tables(cursor, logger)
         _update_db_metadata(cursor, logger)
 
         _update_league_info(yq, cursor, league_id, sanitized_name, league_metadata, logger)
-        _update_teams_info(yq, cursor, logger)
+        _update_teams_info(yq, cursor, logger, getattr(league_metadata, 'teams', None))
         playoff_start_week = _update_league_scoring_settings(yq, cursor, logger)
         _update_lineup_settings(yq, cursor, logger)
-        _update_fantasy_weeks(yq, cursor, league_metadata.league_key, logger)
+        _update_fantasy_weeks(league_feeds, cursor, league_metadata.league_key, logger)
         _update_league_matchups(yq, cursor, playoff_start_week, logger)
-        _update_league_transactions(yq, cursor, logger)
+        _update_league_transactions(league_feeds, cursor, logger)
 
         _update_daily_lineups(yq, cursor, conn, league_metadata.num_teams, league_metadata.start_date, capture_lineups, logger)
         _update_current_rosters(yq, cursor, conn, league_metadata.num_teams, logger)
@@ -1392,9 +1812,9 @@ def update_league_db(yq, lg, league_id, data_dir, logger, capture_lineups=False)
             logger.error("Yahoo Fantasy API (lg) object is None. Skipping FA, Waiver, and Rostered Players update.")
             logger.error("This is expected in dev mode.")
         else:
-            _update_free_agents(lg, conn, logger)
-            _update_waivers(lg, conn, logger)
-            _update_rostered_players(lg, conn, logger)
+            _update_free_agents(player_pools, conn, logger)
+            _update_waivers(player_pools, conn, logger)
+            _update_rostered_players(player_pools, conn, logger)
             _update_db_metadata(cursor, logger, update_available_players_timestamp=True)
 
         conn.commit()
@@ -1417,6 +1837,7 @@ def update_league_db(yq, lg, league_id, data_dir, logger, capture_lineups=False)
             finalizer.process_with_projections(PROJECTIONS_DB_PATH)
             finalizer.parse_and_store_player_stats()
             finalizer.parse_and_store_bench_stats()
+            finalizer.checkpoint()
             finalizer.close_connection()
         else:
             # --- MODIFIED ---
@@ -1439,3 +1860,12 @@ def update_league_db(yq, lg, league_id, data_dir, logger, capture_lineups=False)
         # --- MODIFIED ---
         logger.error(f"Database update process failed: {e}", exc_info=True)
         return {'success': False, 'error': str(e)}
+    finally:
+        if prefetch_executor is not None:
+            prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        # A failed build must not keep the DB file open: the handle pins the
+        # old file (and its fd) until GC, even after a rebuild replaces it.
+        if conn is not None:
+            conn.close()
+        if finalizer is not None:
+            finalizer.close_connection()